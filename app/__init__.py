@@ -1,47 +1,98 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
-import os  # <--- ДОБАВЬТЕ ЭТУ СТРОКУ!
+from app.cache import WeekCache
+from app.live import LiveUpdates
+from app.metrics import RequestMetrics
+from app.replica import ReplicaRouter, RoutingSession
 
-# Создаем экземпляры ТОЛЬКО здесь
-db = SQLAlchemy()
+# Создаем экземпляры ТОЛЬКО здесь.
+# init_app у расширений не обращается к БД и Redis: подключения создаются при первом запросе
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 login_manager = LoginManager()
+week_cache = WeekCache()
+live_updates = LiveUpdates()
+replica_router = ReplicaRouter()
+request_metrics = RequestMetrics()
 
-def create_app():
+
+def create_app(config=None):
+    """Собрать приложение без побочных эффектов: ни запросов к БД, ни вывода
+
+    config - словарь поверх config.Config (тесты, бенчмарки). Схему БД
+    создаёт отдельная команда `flask init-db`.
+    """
     app = Flask(__name__)
     app.config.from_object('config.Config')
+    if config:
+        app.config.update(config)
+    
+    # Уровень и формат логов (LOG_LEVEL, LOG_FORMAT)
+    from app.logs import init_logging
+    init_logging(app)
+    
+    if not app.config.get('SQLALCHEMY_DATABASE_URI'):
+        raise RuntimeError(
+            'Переменная окружения DATABASE_URL не установлена! '
+            'Установите её в Render: Settings → Environment Variables'
+        )
+    
+    # Пул соединений по профилю DB_PROFILE; явные SQLALCHEMY_ENGINE_OPTIONS важнее
+    from app.pool import engine_options
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        **engine_options(app.config),
+        **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    }
+    
+    # Реплика для чтения (REPLICA_DATABASE_URL) - до db.init_app, она добавляет bind
+    replica_router.init_app(app, engine_options(app.config, app.config.get('REPLICA_DATABASE_URL')))
     
     # Инициализируем расширения
     db.init_app(app)
     login_manager.init_app(app)
+    week_cache.init_app(app)
+    live_updates.init_app(app)
+    request_metrics.init_app(app)
     
-    # Диагностика подключения к БД
-    with app.app_context():
-        database_url = app.config.get('SQLALCHEMY_DATABASE_URI', 'Не задана!')
-        safe_url = database_url.replace('postgresql://', 'postgresql://(скрыто)@') if 'postgresql://' in database_url else database_url
-        print(f" * Конфигурация БД: {safe_url}")
-        
-        print(f" * Переменная DATABASE_URL из окружения: {os.environ.get('DATABASE_URL', 'Не задана!')}")
-        
-        # Создаем таблицы если их нет
-        db.create_all()
-        print(" * База данных проверена, таблицы готовы к работе.")
+    # JSON-бэкенд для jsonify (orjson, если установлен)
+    from app.serializers import init_json
+    init_json(app)
     
     # Настраиваем login_manager
     login_manager.login_view = 'main.login'  # Указываем endpoint для логина
     
-    # Регистрируем Blueprints
-    from app.routes.main_routes import main_bp
-    from app.routes.api_routes import api_bp
-        
-    app.register_blueprint(main_bp)
-    app.register_blueprint(api_bp, url_prefix='/api/v1')
+    register_blueprints(app)
+    register_commands(app)
     
-    # Настраиваем user_loader
-    from app.models import User
+    # Настраиваем user_loader (через кэш, см. app/auth.py)
+    from app.auth import load_session_user
     
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        return load_session_user(int(user_id))
     
     return app
+
+
+def register_blueprints(app):
+    # Маршруты импортируются здесь, а не при импорте пакета app
+    from app.routes.main_routes import main_bp
+    from app.routes.api_routes import api_bp
+    
+    app.register_blueprint(main_bp)
+    app.register_blueprint(api_bp, url_prefix='/api/v1')
+
+
+def register_commands(app):
+    # CLI: flask init-db, flask apply-migrations
+    from app.schema import apply_migrations_command, init_db_command
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(apply_migrations_command)
+    
+    # CLI: flask backfill-rollups
+    from app.rollups import backfill_rollups_command
+    app.cli.add_command(backfill_rollups_command)
+    
+    # CLI: flask purge-tombstones
+    from app.sync import purge_tombstones_command
+    app.cli.add_command(purge_tombstones_command)
@@ -1,13 +1,104 @@
 from flask_login import LoginManager
 from functools import wraps
+from collections import namedtuple
 from flask import redirect, url_for, flash, request
-from flask_login import current_user
+from flask_login import current_user, UserMixin
+from sqlalchemy import event
+from app.cache import LocalBackend
+from app.models import User
 
 login_manager = LoginManager()
 login_manager.login_view = 'auth.login'
 login_manager.login_message = 'Пожалуйста, войдите для доступа к этой странице.'
 login_manager.login_message_category = 'warning'
 
+# Кэш telegram_id -> пользователь для запросов бота (у каждого воркера свой)
+TelegramIdentity = namedtuple('TelegramIdentity', 'id username has_categories')
+telegram_identities = LocalBackend(maxsize=4096, ttl=60)
+
+
+def resolve_telegram_identity(telegram_id):
+    """Найти пользователя по telegram_id (из кэша или одним запросом с EXISTS)"""
+    telegram_id = str(telegram_id)
+    identity = telegram_identities.get(telegram_id)
+    if identity is not None:
+        return identity
+    
+    from sqlalchemy import exists
+    from app import db
+    from app.models import Category
+    row = db.session.query(
+        User.id,
+        User.username,
+        exists().where(Category.user_id == User.id).label('has_categories')
+    ).filter(User.telegram_id == telegram_id).first()
+    
+    # Отсутствие пользователя не кэшируем: он может зарегистрироваться в любой момент
+    if row is None:
+        return None
+    
+    identity = TelegramIdentity(*row)
+    telegram_identities.set(telegram_id, identity)
+    return identity
+
+
+def invalidate_telegram_identity(telegram_id):
+    """Сбросить кэш после регистрации или изменения категорий"""
+    if telegram_id:
+        telegram_identities.delete(str(telegram_id))
+
+
+# Кэш пользователей сессии для user_loader: current_user без запроса к БД
+session_users = LocalBackend(maxsize=4096, ttl=120)
+
+
+class SessionUser(UserMixin):
+    """Лёгкая копия пользователя для current_user (только чтение)"""
+    
+    def __init__(self, id, username, telegram_id, created_at):
+        self.id = id
+        self.username = username
+        self.telegram_id = telegram_id
+        self.created_at = created_at
+    
+    def __repr__(self):
+        return f'<SessionUser {self.username}>'
+
+
+def load_session_user(user_id):
+    """Пользователь для Flask-Login: из кэша или одним запросом без password_hash"""
+    user = session_users.get(user_id)
+    if user is not None:
+        return user
+    
+    from app import db
+    row = db.session.query(
+        User.id, User.username, User.telegram_id, User.created_at
+    ).filter(User.id == user_id).first()
+    if row is None:
+        return None
+    
+    user = SessionUser(*row)
+    session_users.set(user_id, user)
+    return user
+
+
+def invalidate_session_user(user_id):
+    """Сбросить кэш после смены пароля или удаления пользователя"""
+    if user_id is not None:
+        session_users.delete(user_id)
+
+
+@event.listens_for(User.password_hash, 'set')
+def _password_changed(target, value, oldvalue, initiator):
+    invalidate_session_user(target.id)
+
+
+@event.listens_for(User, 'after_delete')
+def _user_deleted(mapper, connection, target):
+    invalidate_session_user(target.id)
+    invalidate_telegram_identity(target.telegram_id)
+
 def login_required(f):
     """Декоратор для проверки аутентификации"""
     @wraps(f)
@@ -27,8 +118,7 @@ def telegram_auth_required(f):
         if not telegram_id:
             return {'error': 'Telegram ID required'}, 401
         
-        from app.models import User
-        user = User.query.filter_by(telegram_id=telegram_id).first()
+        user = resolve_telegram_identity(telegram_id)
         
         if not user:
             return {'error': 'User not found. Please register first via web.'}, 404
@@ -0,0 +1,71 @@
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import insert, text
+
+from app import db
+from app.live import record_change
+from app.models import Event
+from app.rollups import add_delta, apply_deltas
+from app.serializers import iso_z
+
+# Сколько строк отправлять в одном INSERT ... VALUES
+INSERT_CHUNK_SIZE = 1000
+
+
+def bulk_insert_events(rows):
+    """Вставить события пачкой в текущей транзакции, вернуть их id в порядке rows
+
+    rows - словари с полями Event (user_id, category_id, start_time, end_time, type, source).
+    На PostgreSQL это один запрос за id из последовательности и один
+    INSERT ... VALUES на каждые INSERT_CHUNK_SIZE строк; на остальных СУБД
+    (SQLite в тестах) - обычный flush ORM.
+    """
+    if not rows:
+        return []
+
+    if db.session.get_bind().dialect.name != 'postgresql':
+        events = [Event(**row) for row in rows]
+        db.session.add_all(events)
+        db.session.flush()
+        return [event.id for event in events]
+
+    # Порядок строк RETURNING PostgreSQL не гарантирует, поэтому id берём из
+    # последовательности заранее и вставляем явно - каждый id привязан к своей строке
+    ids = [row[0] for row in db.session.execute(
+        text("SELECT nextval(pg_get_serial_sequence('events', 'id')) FROM generate_series(1, :count)"),
+        {'count': len(rows)}
+    )]
+
+    now = datetime.utcnow()
+    values = [{
+        'type': 'plan',
+        'source': 'web',
+        'created_at': now,
+        'updated_at': now,
+        **row,
+        'id': event_id
+    } for event_id, row in zip(ids, rows)]
+
+    table = Event.__table__
+    for offset in range(0, len(values), INSERT_CHUNK_SIZE):
+        db.session.execute(insert(table).values(values[offset:offset + INSERT_CHUNK_SIZE]))
+
+    # Core-вставка минует before_flush, поэтому агрегаты обновляем сами
+    deltas = defaultdict(lambda: [0, 0])
+    for row in values:
+        add_delta(deltas, (row['user_id'], row['category_id'], row['start_time'], row['end_time'], row['type']), 1)
+    apply_deltas(db.session.connection(), deltas)
+
+    # И живые обновления: after_flush эти строки тоже не видит
+    for row in values:
+        record_change(db.session, row['user_id'], 'events', {
+            'id': row['id'],
+            'category_id': row['category_id'],
+            'start_time': iso_z(row['start_time']),
+            'end_time': iso_z(row['end_time']),
+            'type': row['type'],
+            'source': row['source']
+        })
+
+    return ids
@@ -0,0 +1,163 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+def week_key_for(dt):
+    """ISO-неделя даты в формате 'YYYY-Www' (как у input type="week")"""
+    year, week, _ = dt.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+class LocalBackend:
+    """In-process хранилище: LRU с TTL, своё у каждого воркера"""
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 3) if total else 0
+        }
+
+
+class RedisBackend:
+    """Общее хранилище для нескольких воркеров gunicorn (нужен пакет redis)"""
+
+    def __init__(self, url, ttl=300, prefix='tt:week:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('Для WEEK_CACHE_URL нужен пакет redis: pip install redis')
+        self._client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self._client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value):
+        self._client.set(self.prefix + key, json.dumps(value), ex=self.ttl)
+
+    def delete(self, key):
+        self._client.delete(self.prefix + key)
+
+    def clear(self):
+        for key in self._client.scan_iter(self.prefix + '*'):
+            self._client.delete(key)
+
+    def __len__(self):
+        return sum(1 for _ in self._client.scan_iter(self.prefix + '*'))
+
+
+class WeekCache:
+    """Кэш готовых ответов /api/events/week/<week_id> по (user_id, ISO-неделя)
+
+    variant различает форматы ответа одной недели (None - обычный, 'columnar').
+    version - версии данных (DataVersion), из которых построен ответ: запись
+    с другой версией считается промахом, поэтому ответ, собранный до
+    параллельной записи или в другом воркере, не переживает изменение данных.
+    """
+
+    VARIANTS = (None, 'columnar')
+
+    def __init__(self, backend=None):
+        self.backend = backend or LocalBackend()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        ttl = app.config.get('WEEK_CACHE_TTL', 300)
+        url = app.config.get('WEEK_CACHE_URL')
+        if url:
+            self.backend = RedisBackend(url, ttl=ttl)
+        else:
+            self.backend = LocalBackend(
+                maxsize=app.config.get('WEEK_CACHE_MAXSIZE', 1024),
+                ttl=ttl
+            )
+        app.extensions['week_cache'] = self
+
+    @staticmethod
+    def _key(user_id, week_key, variant=None):
+        key = f'{user_id}:{week_key}'
+        return f'{key}:{variant}' if variant else key
+
+    def get(self, user_id, week_key, variant=None, version=None):
+        entry = self.backend.get(self._key(user_id, week_key, variant))
+        if entry is None or entry['version'] != _version(version):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry['payload']
+
+    def set(self, user_id, week_key, payload, variant=None, version=None):
+        self.backend.set(self._key(user_id, week_key, variant), {'version': _version(version), 'payload': payload})
+
+    def invalidate(self, user_id, *moments):
+        """Сбросить недели, в которые попадают переданные datetime"""
+        for week_key in {week_key_for(dt) for dt in moments if dt is not None}:
+            for variant in self.VARIANTS:
+                self.backend.delete(self._key(user_id, week_key, variant))
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'backend': type(self.backend).__name__,
+            'size': len(self.backend),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 3) if total else 0
+        }
+
+
+def _version(version):
+    # Кортеж версий после JSON (Redis) становится списком
+    return list(version) if version is not None else None
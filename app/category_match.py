@@ -0,0 +1,205 @@
+import threading
+
+from app import db
+from app.cache import LocalBackend
+from app.models import Category, CategoryAlias
+from app.replica import primary_reads
+from app.versioning import get_versions
+
+# Вид термина: короткий код важнее названия при равных остальных условиях
+ALIAS = 0
+NAME = 1
+
+# Ключ узла префиксного дерева со множеством терминов под ним
+_TERMS = ''
+
+MAX_ALIAS_LENGTH = 32
+
+
+def normalize_code(code):
+    """Код из сообщения: без пробелов по краям, в нижнем регистре, ё = е"""
+    return ' '.join(str(code).split()).lower().replace('ё', 'е')
+
+
+class CategoryMatcher:
+    """Поиск категории пользователя по коду: префиксное дерево названий и кодов
+
+    Порядок детерминирован: точное совпадение, затем префикс (короче термин -
+    выше), затем подстрока (раньше вхождение - выше). При равенстве короткий
+    код важнее названия, а из двух категорий выбирается меньший id.
+    """
+
+    def __init__(self, version=0):
+        self.version = version
+        self._names = {}        # category_id -> название
+        self._category_terms = {}  # category_id -> {(термин, вид)}
+        self._terms = {}        # термин -> {(вид, category_id)}
+        self._trie = {}
+
+    def __len__(self):
+        return len(self._names)
+
+    def add(self, category_id, name, aliases=()):
+        """Добавить или переименовать категорию"""
+        if category_id in self._names:
+            self.remove(category_id)
+        self._names[category_id] = name
+        self._category_terms[category_id] = set()
+        self._add_term(category_id, normalize_code(name), NAME)
+        for alias in aliases:
+            self._add_term(category_id, alias, ALIAS)
+
+    def remove(self, category_id):
+        self._names.pop(category_id, None)
+        for term, kind in self._category_terms.pop(category_id, ()):
+            self._remove_term(category_id, term, kind)
+
+    def add_alias(self, category_id, alias):
+        if category_id in self._names:
+            self._add_term(category_id, alias, ALIAS)
+
+    def remove_alias(self, category_id, alias):
+        if (alias, ALIAS) in self._category_terms.get(category_id, ()):
+            self._remove_term(category_id, alias, ALIAS)
+
+    def _add_term(self, category_id, term, kind):
+        if not term:
+            return
+        self._category_terms[category_id].add((term, kind))
+        owners = self._terms.get(term)
+        if owners is None:
+            owners = self._terms[term] = set()
+            node = self._trie
+            for char in term:
+                node = node.setdefault(char, {})
+                node.setdefault(_TERMS, set()).add(term)
+        owners.add((kind, category_id))
+
+    def _remove_term(self, category_id, term, kind):
+        terms = self._category_terms.get(category_id)
+        if terms is not None:
+            terms.discard((term, kind))
+        owners = self._terms.get(term)
+        if owners is None:
+            return
+        owners.discard((kind, category_id))
+        if owners:
+            return
+        del self._terms[term]
+        node = self._trie
+        for char in term:
+            child = node[char]
+            child[_TERMS].discard(term)
+            if not child[_TERMS]:
+                del node[char]
+                return
+            node = child
+
+    def _best(self, candidates):
+        """(category_id, название) с наименьшим ключом ранжирования"""
+        if not candidates:
+            return None
+        _, category_id = min(candidates)
+        return category_id, self._names[category_id]
+
+    def match(self, code):
+        """Лучшая категория для кода: (category_id, название) или None"""
+        code = normalize_code(code)
+        if not code:
+            return None
+
+        owners = self._terms.get(code)
+        if owners:
+            return self._best([((kind, category_id), category_id) for kind, category_id in owners])
+
+        node = self._trie
+        for char in code:
+            node = node.get(char)
+            if node is None:
+                break
+        else:
+            return self._best([
+                ((len(term), kind, category_id), category_id)
+                for term in node[_TERMS]
+                for kind, category_id in self._terms[term]
+            ])
+
+        return self._best([
+            ((term.find(code), len(term), kind, category_id), category_id)
+            for term, owners in self._terms.items() if code in term
+            for kind, category_id in owners
+        ])
+
+
+class CategoryMatchers:
+    """Деревья поиска по пользователям, своё у каждого воркера
+
+    Актуальность сверяется со счётчиком DataVersion.categories (один запрос
+    по первичному ключу). Изменения этого воркера применяются к дереву
+    на месте, изменения других воркеров приводят к перестроению.
+    """
+
+    def __init__(self, maxsize=2048, ttl=3600):
+        self.backend = LocalBackend(maxsize=maxsize, ttl=ttl)
+        self.rebuilds = 0
+        self._lock = threading.Lock()
+
+    def _build(self, user_id, version):
+        aliases = {}
+        for category_id, alias in db.session.query(CategoryAlias.category_id, CategoryAlias.alias).filter(
+                CategoryAlias.user_id == user_id):
+            aliases.setdefault(category_id, []).append(alias)
+
+        matcher = CategoryMatcher(version)
+        for category_id, name in db.session.query(Category.id, Category.name).filter(
+                Category.user_id == user_id):
+            matcher.add(category_id, name, aliases.get(category_id, ()))
+
+        self.rebuilds += 1
+        self.backend.set(user_id, matcher)
+        return matcher
+
+    def get(self, user_id):
+        # Дерево общее для запросов воркера - версию и категории читаем из основной БД
+        with primary_reads():
+            (version,) = get_versions(user_id, 'categories')
+            matcher = self.backend.get(user_id)
+            if matcher is None or matcher.version != version:
+                matcher = self._build(user_id, version)
+        return matcher
+
+    def match(self, user_id, code):
+        """(category_id, название) лучшей категории для кода или None"""
+        matcher = self.get(user_id)
+        with self._lock:
+            return matcher.match(code)
+
+    def match_many(self, user_id, codes):
+        """То же для списка кодов - с одной проверкой версии"""
+        matcher = self.get(user_id)
+        with self._lock:
+            return [matcher.match(code) for code in codes]
+
+    def changed(self, user_id, apply):
+        """Применить изменение к дереву после commit (изменение уже подняло версию)
+
+        Если между версией дерева и текущей были чужие изменения, дерево
+        сбрасывается и при следующем поиске строится заново.
+        """
+        matcher = self.backend.get(user_id)
+        if matcher is None:
+            return
+        with primary_reads():
+            (version,) = get_versions(user_id, 'categories')
+        with self._lock:
+            if matcher.version == version - 1:
+                apply(matcher)
+                matcher.version = version
+            else:
+                self.backend.delete(user_id)
+
+    def stats(self):
+        return dict(self.backend.stats(), rebuilds=self.rebuilds)
+
+
+category_matchers = CategoryMatchers()
@@ -0,0 +1,224 @@
+import json
+import logging
+import queue
+import threading
+from collections import defaultdict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Сообщение подписчику, который не успевал читать: пусть заберёт всё через /api/v1/sync
+RESYNC = {'resync': True}
+
+
+class Subscription:
+    """Очередь сообщений одного SSE-соединения"""
+
+    def __init__(self, user_id, maxsize=100):
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize=maxsize)
+
+    def put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            # Клиент отстал - вместо потерянных дельт одна команда на полную сверку
+            with self.queue.mutex:
+                self.queue.queue.clear()
+            self.queue.put_nowait(RESYNC)
+
+    def get(self, timeout):
+        """Следующее сообщение или None, если за timeout ничего не пришло"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class LocalBroker:
+    """Pub/sub внутри процесса: видит только изменения своего воркера"""
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def subscribe(self, user_id):
+        subscription = Subscription(user_id)
+        with self._lock:
+            self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def publish(self, user_id, message):
+        self.published += 1
+        self.deliver(user_id, message)
+
+    def deliver(self, user_id, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for subscription in subscribers:
+            subscription.put(message)
+
+    def streams(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def stats(self):
+        with self._lock:
+            users = len(self._subscribers)
+        return {'backend': type(self).__name__, 'streams': self.streams(), 'users': users, 'published': self.published}
+
+
+class RedisBroker(LocalBroker):
+    """Общий канал Redis для нескольких воркеров gunicorn (нужен пакет redis)
+
+    publish уходит в канал, а фоновый поток каждого воркера раздаёт
+    сообщения своим локальным подписчикам.
+    """
+
+    def __init__(self, url, channel='tt:live'):
+        super().__init__()
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('Для LIVE_BROKER_URL нужен пакет redis: pip install redis')
+        self._client = redis.Redis.from_url(url)
+        self.channel = channel
+        self._listener = None
+        self._listener_lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        self._ensure_listener()
+        return super().subscribe(user_id)
+
+    def publish(self, user_id, message):
+        self.published += 1
+        self._client.publish(self.channel, json.dumps({'user_id': user_id, 'message': message}))
+
+    def _ensure_listener(self):
+        with self._listener_lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._listen, name='live-broker', daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.channel)
+        try:
+            for item in pubsub.listen():
+                try:
+                    data = json.loads(item['data'])
+                    self.deliver(data['user_id'], data['message'])
+                except (ValueError, KeyError, TypeError):
+                    logger.warning('Некорректное сообщение в канале %s', self.channel)
+        except Exception:
+            logger.exception('Подписка на канал %s прервана', self.channel)
+
+
+class LiveUpdates:
+    """Рассылка изменений событий, категорий и шаблонов в SSE-потоки пользователей"""
+
+    def __init__(self, broker=None):
+        self.broker = broker or LocalBroker()
+
+    def init_app(self, app):
+        budget = app.config.get('WEB_THREADS', 32) - app.config.get('LIVE_STREAM_RESERVED_THREADS', 8)
+        limit = app.config.get('LIVE_STREAM_MAX')
+        if limit is not None and limit > budget:
+            logger.warning('LIVE_STREAM_MAX=%s не оставляет потоков обычным запросам (WEB_THREADS=%s), '
+                           'используется %s', limit, app.config.get('WEB_THREADS', 32), max(budget, 0))
+            app.config['LIVE_STREAM_MAX'] = max(budget, 0)
+        url = app.config.get('LIVE_BROKER_URL')
+        self.broker = RedisBroker(url) if url else LocalBroker()
+        app.extensions['live_updates'] = self
+
+    def subscribe(self, user_id, limit=None):
+        """Подписка на изменения пользователя; None, если открыто уже limit потоков"""
+        if limit is not None and self.broker.streams() >= limit:
+            return None
+        return self.broker.subscribe(user_id)
+
+    def unsubscribe(self, subscription):
+        self.broker.unsubscribe(subscription)
+
+    def publish(self, user_id, message):
+        try:
+            self.broker.publish(user_id, message)
+        except Exception:
+            # Запись уже закоммичена; клиенты догонят через /api/v1/sync
+            logger.exception('Не удалось разослать изменения пользователя %s', user_id)
+
+    def stats(self):
+        return self.broker.stats()
+
+
+def _serialize(kind, obj):
+    from app.serializers import event_dict
+
+    if kind == 'events':
+        return event_dict(obj)
+    if kind == 'categories':
+        return {'id': obj.id, 'name': obj.name, 'color': obj.color}
+    return {'id': obj.id, 'name': obj.name}
+
+
+def record_change(session, user_id, kind, data=None, deleted_id=None):
+    """Запомнить изменение до commit (для записей мимо ORM, например bulk_insert_events)"""
+    session.info.setdefault('live_changes', []).append((user_id, kind, data, deleted_id))
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changes(session, flush_context):
+    """После flush у новых строк уже есть id, а атрибуты ещё не сброшены commit'ом"""
+    # Модуль импортируется из app/__init__.py раньше моделей
+    from app.sync import _ENTITY_KINDS
+
+    for obj in session.new:
+        kind = _ENTITY_KINDS.get(type(obj))
+        if kind is not None:
+            record_change(session, obj.user_id, kind, _serialize(kind, obj))
+    for obj in session.dirty:
+        kind = _ENTITY_KINDS.get(type(obj))
+        if kind is not None and session.is_modified(obj):
+            record_change(session, obj.user_id, kind, _serialize(kind, obj))
+    for obj in session.deleted:
+        kind = _ENTITY_KINDS.get(type(obj))
+        if kind is not None:
+            record_change(session, obj.user_id, kind, deleted_id=obj.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_changes(session):
+    changes = session.info.pop('live_changes', None)
+    if not changes:
+        return
+
+    from app import live_updates
+
+    messages = {}
+    for user_id, kind, data, deleted_id in changes:
+        delta = messages.setdefault(user_id, {}).setdefault(kind, {'upsert': {}, 'deleted': []})
+        if deleted_id is not None:
+            delta['upsert'].pop(deleted_id, None)
+            delta['deleted'].append(deleted_id)
+        else:
+            delta['upsert'][data['id']] = data
+    for user_id, message in messages.items():
+        for delta in message.values():
+            delta['upsert'] = list(delta['upsert'].values())
+        live_updates.publish(user_id, message)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('live_changes', None)
@@ -0,0 +1,48 @@
+import json
+import logging
+import sys
+
+from flask import has_request_context, request
+
+# Атрибуты LogRecord, которые не считаются полями extra=
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на запись: время, уровень, логгер, сообщение, поля extra и запрос"""
+
+    def format(self, record):
+        data = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS:
+                data[key] = value
+        if has_request_context():
+            data.setdefault('method', request.method)
+            data.setdefault('path', request.path)
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def init_logging(app):
+    """Логгер пакета app: уровень LOG_LEVEL, формат LOG_FORMAT (text или json)
+
+    Отключённые уровни ничего не стоят: сообщения форматируются только при выводе.
+    """
+    logger = logging.getLogger('app')
+    logger.setLevel(app.config.get('LOG_LEVEL', 'INFO'))
+    if getattr(logger, '_tt_configured', False):
+        return
+    handler = logging.StreamHandler(sys.stderr)
+    if app.config.get('LOG_FORMAT') == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    logger.addHandler(handler)
+    logger.propagate = False
+    logger._tt_configured = True
@@ -0,0 +1,194 @@
+import cProfile
+import io
+import logging
+import pstats
+import random
+import threading
+import time
+from collections import defaultdict
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограммы задержек, секунды
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Накопительная гистограмма в духе Prometheus (без внешних зависимостей)"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        """[(граница, число наблюдений <= границы)], последняя граница - +Inf"""
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            result.append((bound, total))
+        result.append(('+Inf', self.count))
+        return result
+
+
+class RequestMetrics:
+    """Задержки по endpoint, число SQL-запросов и время в БД, выборочное профилирование
+
+    Всё считается в процессе воркера; /metrics отдаёт данные своего воркера.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = defaultdict(Histogram)        # (endpoint, method) -> Histogram
+        self.responses = defaultdict(int)            # (endpoint, method, status) -> count
+        self.sql_statements = defaultdict(int)       # endpoint -> count
+        self.sql_seconds = defaultdict(float)        # endpoint -> seconds
+        self.slow_request_ms = 1000
+        self.profile_rate = 0.0
+        self.profiles = {}                           # endpoint -> pstats.Stats
+        self.profile_samples = defaultdict(int)
+        # cProfile в 3.12 допускает только один активный профилировщик на процесс
+        self._profiler_lock = threading.Lock()
+
+    def init_app(self, app):
+        self.slow_request_ms = app.config.get('SLOW_REQUEST_MS', 1000)
+        self.profile_rate = app.config.get('PROFILE_SAMPLE_RATE', 0.0)
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.teardown_request(self._release_profiler)
+        app.extensions['request_metrics'] = self
+
+    def _start_request(self):
+        g.metrics_started = time.perf_counter()
+        g.sql_count = 0
+        g.sql_seconds = 0.0
+        if self.profile_rate and random.random() < self.profile_rate and self._profiler_lock.acquire(blocking=False):
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    def _finish_request(self, response):
+        started = g.get('metrics_started')
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        endpoint = request.endpoint or 'unmatched'
+        sql_count = g.get('sql_count', 0)
+        sql_seconds = g.get('sql_seconds', 0.0)
+
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            self._profiler_lock.release()
+            self._add_profile(endpoint, profiler)
+
+        with self._lock:
+            self.latency[(endpoint, request.method)].observe(elapsed)
+            self.responses[(endpoint, request.method, response.status_code)] += 1
+            self.sql_statements[endpoint] += sql_count
+            self.sql_seconds[endpoint] += sql_seconds
+
+        if elapsed * 1000 >= self.slow_request_ms:
+            logger.warning('Медленный запрос %s %s: %.0f мс, SQL: %d за %.0f мс',
+                           request.method, request.path, elapsed * 1000, sql_count, sql_seconds * 1000,
+                           extra={'endpoint': endpoint, 'duration_ms': round(elapsed * 1000, 1),
+                                  'sql_count': sql_count, 'sql_ms': round(sql_seconds * 1000, 1)})
+        elif logger.isEnabledFor(logging.DEBUG):
+            logger.debug('%s %s -> %s за %.1f мс, SQL: %d',
+                         request.method, request.path, response.status_code, elapsed * 1000, sql_count)
+        return response
+
+    def _release_profiler(self, exc):
+        # after_request не вызывается, если упал сам after_request - не оставляем профилировщик включённым
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            self._profiler_lock.release()
+
+    def _add_profile(self, endpoint, profiler):
+        with self._lock:
+            stats = self.profiles.get(endpoint)
+            if stats is None:
+                self.profiles[endpoint] = pstats.Stats(profiler)
+            else:
+                stats.add(profiler)
+            self.profile_samples[endpoint] += 1
+
+    def profile_report(self, endpoint, limit=40, sort='cumulative'):
+        """Текстовый отчёт pstats по накопленным выборкам endpoint; None, если их нет"""
+        with self._lock:
+            stats = self.profiles.get(endpoint)
+            if stats is None:
+                return None
+            stream = io.StringIO()
+            stats.stream = stream
+            stats.sort_stats(sort).print_stats(limit)
+        return f'Выборок: {self.profile_samples[endpoint]}\n' + stream.getvalue()
+
+    def prometheus(self, extra=()):
+        """Текст в формате Prometheus exposition 0.0.4
+
+        extra - [(имя, тип, описание, значение)] для показателей вне запросов.
+        """
+        lines = [
+            '# HELP tt_http_request_duration_seconds Время обработки запроса',
+            '# TYPE tt_http_request_duration_seconds histogram',
+        ]
+        with self._lock:
+            for (endpoint, method), histogram in sorted(self.latency.items()):
+                labels = f'endpoint="{_label(endpoint)}",method="{method}"'
+                for bound, count in histogram.cumulative():
+                    lines.append(f'tt_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'tt_http_request_duration_seconds_sum{{{labels}}} {histogram.sum:.6f}')
+                lines.append(f'tt_http_request_duration_seconds_count{{{labels}}} {histogram.count}')
+
+            lines.append('# HELP tt_http_responses_total Ответы по статусам')
+            lines.append('# TYPE tt_http_responses_total counter')
+            for (endpoint, method, status), count in sorted(self.responses.items()):
+                lines.append(f'tt_http_responses_total{{endpoint="{_label(endpoint)}",method="{method}",'
+                             f'status="{status}"}} {count}')
+
+            lines.append('# HELP tt_db_statements_total SQL-запросы, выполненные при обработке запросов')
+            lines.append('# TYPE tt_db_statements_total counter')
+            for endpoint, count in sorted(self.sql_statements.items()):
+                lines.append(f'tt_db_statements_total{{endpoint="{_label(endpoint)}"}} {count}')
+
+            lines.append('# HELP tt_db_duration_seconds_total Время выполнения SQL при обработке запросов')
+            lines.append('# TYPE tt_db_duration_seconds_total counter')
+            for endpoint, seconds in sorted(self.sql_seconds.items()):
+                lines.append(f'tt_db_duration_seconds_total{{endpoint="{_label(endpoint)}"}} {seconds:.6f}')
+
+        for name, kind, description, value in extra:
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['query_started'] = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'sql_count' in g:
+        g.sql_count += 1
+        g.sql_seconds += time.perf_counter() - conn.info['query_started']
@@ -30,9 +30,11 @@ class Category(db.Model):
     name = db.Column(db.String(64), nullable=False)
     color = db.Column(db.String(7), default='#4361ee')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     __table_args__ = (
         db.UniqueConstraint('user_id', 'name', name='unique_category_per_user'),
+        db.Index('idx_category_user_updated', 'user_id', 'updated_at'),
     )
     
     def to_dict(self):
@@ -47,6 +49,37 @@ class Category(db.Model):
         return f'<Category {self.name}>'
 
 
+# Точный поиск категории по названию без учёта регистра
+db.Index('idx_category_user_lower_name', Category.user_id, db.func.lower(Category.name))
+
+
+class CategoryAlias(db.Model):
+    """Короткий код категории для быстрого ввода из бота (например, "ПАРА")"""
+    __tablename__ = 'category_aliases'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey('categories.id', ondelete='CASCADE'), nullable=False)
+    alias = db.Column(db.String(32), nullable=False)  # хранится в нижнем регистре
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    category = db.relationship('Category', backref=db.backref('aliases', cascade='all, delete-orphan'))
+    
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'alias', name='unique_alias_per_user'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'category_id': self.category_id,
+            'alias': self.alias
+        }
+    
+    def __repr__(self):
+        return f'<CategoryAlias {self.alias}>'
+
+
 class Event(db.Model):
     __tablename__ = 'events'
     
@@ -58,27 +91,22 @@ class Event(db.Model):
     type = db.Column(db.String(10), nullable=False, default='plan')
     source = db.Column(db.String(10), nullable=False, default='web')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Категория события; грузите через joinedload, чтобы не делать запрос на каждую строку
+    category = db.relationship('Category', lazy='select')
     
     __table_args__ = (
         db.Index('idx_event_user', 'user_id'),
         db.Index('idx_event_user_time', 'user_id', 'start_time'),
+        db.Index('idx_event_user_type_time', 'user_id', 'type', 'start_time', 'end_time'),
+        db.Index('idx_event_user_updated', 'user_id', 'updated_at'),
     )
     
-def to_dict(self):
-    """Безопасная сериализация события с корректным форматом времени."""
-    def safe_iso(dt):
-        # Возвращает дату в формате ISO с 'Z' для UTC, если дата не None
-        return dt.isoformat() + 'Z' if dt else None
-    
-    return {
-        'id': self.id,
-        'category_id': self.category_id,
-        'start_time': safe_iso(self.start_time),
-        'end_time': safe_iso(self.end_time),
-        'type': self.type,
-        'source': self.source,
-        'created_at': safe_iso(self.created_at)
-    }
+    def to_dict(self):
+        """Безопасная сериализация события с корректным форматом времени."""
+        from app.serializers import event_dict
+        return event_dict(self)
     
     def __repr__(self):
         return f'<Event {self.type} {self.start_time}>'
@@ -92,6 +120,83 @@ class Template(db.Model):
     name = db.Column(db.String(100), nullable=False)
     data = db.Column(db.JSON, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('idx_template_user_updated', 'user_id', 'updated_at'),
+    )
     
     def __repr__(self):
         return f'<Template {self.name}>'
+
+
+class DataVersion(db.Model):
+    """Счётчики изменений данных пользователя (для ETag)"""
+    __tablename__ = 'data_versions'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    events = db.Column(db.Integer, nullable=False, default=0)
+    categories = db.Column(db.Integer, nullable=False, default=0)
+    templates = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<DataVersion {self.user_id}>'
+
+
+class DailyRollup(db.Model):
+    """Агрегаты событий по дням: пользователь × день × категория × тип"""
+    __tablename__ = 'daily_rollups'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    category_id = db.Column(db.Integer, primary_key=True)
+    type = db.Column(db.String(10), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    minutes = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<DailyRollup {self.user_id} {self.day} {self.type}>'
+
+
+class IngestKey(db.Model):
+    """Ключи идемпотентности для пакетной загрузки событий из бота"""
+    __tablename__ = 'ingest_keys'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    key = db.Column(db.String(64), primary_key=True)
+    event_id = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<IngestKey {self.user_id} {self.key}>'
+
+
+class UserSummary(db.Model):
+    """Итоговые счётчики событий пользователя (обновляются вместе с daily_rollups)"""
+    __tablename__ = 'user_summaries'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    total_events = db.Column(db.Integer, nullable=False, default=0)
+    plan_events = db.Column(db.Integer, nullable=False, default=0)
+    fact_events = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<UserSummary {self.user_id}>'
+
+
+class Tombstone(db.Model):
+    """Запись об удалении события, категории или шаблона (для /api/v1/sync)"""
+    __tablename__ = 'sync_tombstones'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    entity = db.Column(db.String(16), nullable=False)  # events, categories, templates
+    entity_id = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('idx_tombstone_user_deleted', 'user_id', 'deleted_at'),
+    )
+    
+    def __repr__(self):
+        return f'<Tombstone {self.entity} {self.entity_id}>'
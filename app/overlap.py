@@ -0,0 +1,121 @@
+from bisect import bisect_left, bisect_right
+
+from sqlalchemy import func
+
+from app import db
+from app.models import Event
+
+
+class IntervalIndex:
+    """Интервалы [start, end), отсортированные по началу, с префиксным максимумом концов
+
+    Проверка пересечения - O(log n): среди интервалов с началом раньше
+    конца запроса достаточно сравнить наибольший конец с началом запроса.
+    Добавление - вставка в отсортированные списки (сдвиг памяти, O(n)) и
+    обновление префиксного максимума от места вставки, пока он меняется.
+    """
+
+    def __init__(self, intervals=()):
+        self._items = sorted(intervals, key=lambda item: item[0])
+        self._starts = [item[0] for item in self._items]
+        self._max_ends = []
+        for item in self._items:
+            if self._max_ends and self._max_ends[-1][0] >= item[1]:
+                self._max_ends.append(self._max_ends[-1])
+            else:
+                self._max_ends.append((item[1], item))
+
+    def add(self, start, end, payload=None):
+        item = (start, end, payload)
+        position = bisect_right(self._starts, start)
+        self._items.insert(position, item)
+        self._starts.insert(position, start)
+        previous = self._max_ends[position - 1] if position else None
+        self._max_ends.insert(position, previous if previous and previous[0] >= end else (end, item))
+        # Префиксный максимум не убывает: дальше правим только концы меньше нового
+        for index in range(position + 1, len(self._max_ends)):
+            if self._max_ends[index][0] >= end:
+                break
+            self._max_ends[index] = (end, item)
+
+    def find(self, start, end):
+        """Вернуть какой-нибудь интервал, пересекающийся с [start, end), или None"""
+        count = bisect_left(self._starts, end)
+        if count == 0:
+            return None
+        max_end, item = self._max_ends[count - 1]
+        return item if max_end > start else None
+
+    def find_all(self, start, end):
+        """Все интервалы, пересекающиеся с [start, end)"""
+        count = bisect_left(self._starts, end)
+        return [item for item in self._items[:count] if item[1] > start]
+
+    def __len__(self):
+        return len(self._items)
+
+
+class OverlapChecker:
+    """Проверка перекрытий для пачки событий: отдельный индекс на каждый тип"""
+
+    def __init__(self):
+        self._indexes = {}
+
+    def add(self, event_type, start, end, payload=None):
+        self._indexes.setdefault(event_type, IntervalIndex()).add(start, end, payload)
+
+    def find(self, event_type, start, end):
+        index = self._indexes.get(event_type)
+        return index.find(start, end) if index else None
+
+    def find_all(self, event_type, start, end):
+        index = self._indexes.get(event_type)
+        return index.find_all(start, end) if index else []
+
+    @classmethod
+    def load(cls, user_id, rows, entities=False):
+        """Загрузить события пользователя, покрывающие диапазон rows, одним запросом
+
+        rows - словари с start_time, end_time и type. При entities=True в
+        payload лежат сами объекты Event, иначе их id.
+        """
+        checker = cls()
+        if not rows:
+            return checker
+        query = Event.query if entities else db.session.query(Event.id, Event.type, Event.start_time, Event.end_time)
+        existing = query.filter(
+            Event.user_id == user_id,
+            Event.type.in_({row['type'] for row in rows}),
+            Event.start_time < max(row['end_time'] for row in rows),
+            Event.end_time > min(row['start_time'] for row in rows)
+        )
+        intervals = {}
+        for event in existing:
+            payload = event if entities else event.id
+            intervals.setdefault(event.type, []).append((event.start_time, event.end_time, payload))
+        for event_type, items in intervals.items():
+            checker._indexes[event_type] = IntervalIndex(items)
+        return checker
+
+
+def find_overlap(user_id, event_type, start_time, end_time, exclude_id=None):
+    """id существующего события того же типа, пересекающегося с [start_time, end_time)
+
+    На PostgreSQL используется пересечение tsrange (GiST-индекс из
+    migrations/001_event_overlap_index.sql), на остальных СУБД - индекс
+    idx_event_user_type_time.
+    """
+    query = db.session.query(Event.id).filter(
+        Event.user_id == user_id,
+        Event.type == event_type
+    )
+    if db.session.get_bind().dialect.name == 'postgresql':
+        query = query.filter(
+            func.tsrange(Event.start_time, Event.end_time).op('&&')(func.tsrange(start_time, end_time))
+        )
+    else:
+        query = query.filter(Event.start_time < end_time, Event.end_time > start_time)
+    if exclude_id is not None:
+        query = query.filter(Event.id != exclude_id)
+    row = query.first()
+    return row[0] if row else None
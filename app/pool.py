@@ -0,0 +1,126 @@
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+from app import db
+
+
+class PoolMetrics:
+    """Счётчики пула соединений процесса: выдачи, ожидание, таймауты, переподключения"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.waits = 0
+            self.wait_total = 0.0
+            self.wait_max = 0.0
+            self.timeouts = 0
+            self.connects = 0
+            self.invalidations = 0
+
+    def observe_checkout(self, elapsed, failed=False):
+        with self._lock:
+            if failed:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            # Выдача из свободных соединений занимает микросекунды; дольше - ждали
+            if elapsed >= 0.001:
+                self.waits += 1
+            self.wait_total += elapsed
+            self.wait_max = max(self.wait_max, elapsed)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'wait_total_ms': round(self.wait_total * 1000, 1),
+                'wait_avg_ms': round(self.wait_total * 1000 / self.checkouts, 3) if self.checkouts else 0,
+                'wait_max_ms': round(self.wait_max * 1000, 1),
+                'timeouts': self.timeouts,
+                'connects': self.connects,
+                'invalidations': self.invalidations
+            }
+
+
+pool_metrics = PoolMetrics()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool, который замеряет время получения соединения (с ожиданием и pre-ping)"""
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except Exception:
+            pool_metrics.observe_checkout(time.perf_counter() - started, failed=True)
+            raise
+        pool_metrics.observe_checkout(time.perf_counter() - started)
+        return connection
+
+
+@event.listens_for(TimedQueuePool, 'connect')
+def _on_connect(dbapi_connection, connection_record):
+    pool_metrics.connects += 1
+
+
+@event.listens_for(TimedQueuePool, 'invalidate')
+def _on_invalidate(dbapi_connection, connection_record, exception):
+    # pre-ping нашёл разорванное соединение или запрос упал на нём
+    pool_metrics.invalidations += 1
+
+
+def engine_options(config, url=None):
+    """SQLALCHEMY_ENGINE_OPTIONS из профиля DB_PROFILE и переменных DB_*
+
+    url - другая БД с тем же профилем (реплика); по умолчанию основная.
+    Для SQLite параметры пула и statement_timeout не применяются.
+    """
+    url = url or config.get('SQLALCHEMY_DATABASE_URI')
+    if not url or make_url(url).get_backend_name() != 'postgresql':
+        return {}
+
+    profile = dict(config['DB_PROFILES'][config.get('DB_PROFILE', 'production')])
+    for key in ('pool_size', 'max_overflow', 'pool_timeout', 'pool_recycle', 'statement_timeout_ms'):
+        value = config.get('DB_' + key.upper())
+        if value is not None:
+            profile[key] = value
+
+    options = {
+        'poolclass': TimedQueuePool,
+        'pool_size': profile['pool_size'],
+        'max_overflow': profile['max_overflow'],
+        'pool_timeout': profile['pool_timeout'],
+        'pool_recycle': profile['pool_recycle'],
+        'pool_pre_ping': profile['pool_pre_ping']
+    }
+    if profile['statement_timeout_ms']:
+        # Ограничение действует на каждый запрос соединения; 0 - без ограничения
+        options['connect_args'] = {'options': f"-c statement_timeout={profile['statement_timeout_ms']}"}
+    return options
+
+
+def pool_stats():
+    """Состояние пула основного движка и накопленные метрики"""
+    pool = db.engine.pool
+    stats = {'class': type(pool).__name__, 'status': pool.status()}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            'size': pool.size(),
+            'checked_out': pool.checkedout(),
+            'checked_in': pool.checkedin(),
+            'overflow': max(pool.overflow(), 0),
+            'max_overflow': pool._max_overflow,
+            'timeout_s': pool.timeout()
+        })
+    stats['metrics'] = pool_metrics.stats()
+    return stats
@@ -0,0 +1,142 @@
+from contextlib import contextmanager
+
+from flask import current_app, g, has_request_context, request, session as flask_session
+from flask_sqlalchemy.session import Session
+
+from app.cache import LocalBackend, RedisBackend
+
+REPLICA_BIND = 'replica'
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class RoutingSession(Session):
+    """Сессия db.session: чтения в read-only запросах уходят на реплику
+
+    Запись (flush, INSERT/UPDATE/DELETE) всегда идёт в основную БД и до
+    конца запроса переключает на неё и чтения.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context() and g.get('db_replica'):
+            if self._flushing or getattr(clause, 'is_dml', False):
+                # Запись в read-only запросе: дальше только основная БД
+                g.db_replica = False
+                g.db_wrote = True
+            else:
+                g.db_replica_used = True
+                return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def replica_used():
+    """True, если в этом запросе уже читали с реплики - такие данные нельзя класть в кэши"""
+    return has_request_context() and bool(g.get('db_replica_used'))
+
+
+@contextmanager
+def primary_reads():
+    """Чтения внутри блока - из основной БД (данные для общих кэшей)"""
+    if not has_request_context():
+        yield
+        return
+    previous = g.get('db_replica', False)
+    g.db_replica = False
+    try:
+        yield
+    finally:
+        # Запись внутри блока уже переключила запрос на основную БД
+        if not g.get('db_wrote'):
+            g.db_replica = previous
+
+
+def use_primary(view):
+    """Маркер для GET-обработчиков, которые пишут в БД или не терпят отставания реплики"""
+    view.use_primary = True
+    return view
+
+
+class ReplicaRouter:
+    """Маршрутизация чтений на реплику REPLICA_DATABASE_URL с «липкостью» после записи
+
+    После записи пользователь REPLICA_STICKY_SECONDS читает из основной БД,
+    чтобы видеть свои изменения. Отметки хранятся в процессе, с
+    REPLICA_STICKY_URL (redis://...) - общие для всех воркеров.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.sticky = None
+        self.replica_requests = 0
+        self.primary_requests = 0
+        self.sticky_requests = 0
+
+    def init_app(self, app, engine_options):
+        """Вызывать до db.init_app: добавляет bind 'replica' в SQLALCHEMY_BINDS"""
+        url = app.config.get('REPLICA_DATABASE_URL')
+        if not url:
+            return
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        binds[REPLICA_BIND] = {'url': url, **engine_options}
+        app.config['SQLALCHEMY_BINDS'] = binds
+
+        window = app.config.get('REPLICA_STICKY_SECONDS', 10)
+        sticky_url = app.config.get('REPLICA_STICKY_URL')
+        if sticky_url:
+            self.sticky = RedisBackend(sticky_url, ttl=window, prefix='tt:primary:')
+        else:
+            self.sticky = LocalBackend(maxsize=10000, ttl=window)
+        self.enabled = True
+
+        app.before_request(self._route_request)
+        app.after_request(self._remember_write)
+        app.extensions['replica_router'] = self
+
+    @staticmethod
+    def _sticky_key():
+        """Ключ по пользователю, а не по клиенту: запись из бота видна и в вебе"""
+        user = getattr(request, 'current_user', None)  # telegram_auth_required
+        if user is not None:
+            return f'user:{user.id}'
+        user_id = flask_session.get('_user_id')
+        if user_id is not None:
+            return f'user:{user_id}'
+        telegram_id = request.headers.get('X-Telegram-ID') or request.args.get('telegram_id')
+        if not telegram_id:
+            return None
+        # Кэш telegram_id -> пользователь; при промахе - запрос к основной БД
+        from app.auth import resolve_telegram_identity
+        identity = resolve_telegram_identity(telegram_id)
+        return f'user:{identity.id}' if identity is not None else None
+
+    def _route_request(self):
+        g.db_replica = False
+        g.db_replica_used = False
+        if request.method not in READ_METHODS:
+            self.primary_requests += 1
+            return
+        view = current_app.view_functions.get(request.endpoint) if request.endpoint else None
+        if view is not None and getattr(view, 'use_primary', False):
+            self.primary_requests += 1
+            return
+        key = self._sticky_key()
+        if key is not None and self.sticky.get(key) is not None:
+            self.sticky_requests += 1
+            return
+        g.db_replica = True
+        self.replica_requests += 1
+
+    def _remember_write(self, response):
+        wrote = g.get('db_wrote') or (request.method not in READ_METHODS and response.status_code < 400)
+        if wrote:
+            key = self._sticky_key()
+            if key is not None:
+                self.sticky.set(key, 1)
+        return response
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'replica_requests': self.replica_requests,
+            'primary_requests': self.primary_requests,
+            'sticky_requests': self.sticky_requests
+        }
@@ -0,0 +1,228 @@
+from collections import defaultdict
+from datetime import datetime
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import case, event, func, inspect
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models import Category, Event, DailyRollup, UserSummary
+
+# Поля события, от которых зависят агрегаты (порядок важен для бэкфилла)
+_FIELDS = ('user_id', 'category_id', 'start_time', 'end_time', 'type')
+
+
+def _old_value(state, key):
+    """Значение поля до изменений в текущей сессии"""
+    history = state.attrs[key].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return history.added[0] if history.added else None
+
+
+def _values(obj, old=False):
+    if old:
+        state = inspect(obj)
+        return tuple(_old_value(state, key) for key in _FIELDS)
+    return tuple(getattr(obj, key) for key in _FIELDS)
+
+
+def add_delta(deltas, values, sign):
+    """Учесть одно событие (user_id, category_id, start, end, type) со знаком +1/-1"""
+    user_id, category_id, start_time, end_time, event_type = values
+    if None in (user_id, category_id, start_time, end_time):
+        return
+    delta = deltas[(user_id, start_time.date(), category_id, event_type or 'plan')]
+    delta[0] += sign
+    delta[1] += sign * int((end_time - start_time).total_seconds() // 60)
+
+
+def _upsert_counters(connection, table, rows, keys, counters):
+    """INSERT ... ON CONFLICT с прибавлением counters к существующей строке"""
+    dialect = connection.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=keys,
+            set_={name: table.c[name] + stmt.excluded[name] for name in counters}
+        )
+        connection.execute(stmt, rows)
+        return
+
+    for row in rows:
+        result = connection.execute(
+            table.update()
+            .where(*(table.c[key] == row[key] for key in keys))
+            .values({name: table.c[name] + row[name] for name in counters})
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert(), row)
+
+
+def apply_deltas(connection, deltas):
+    """Применить накопленные изменения к daily_rollups и user_summaries (upsert)"""
+    rows = [{
+        'user_id': user_id,
+        'day': day,
+        'category_id': category_id,
+        'type': event_type,
+        'count': count,
+        'minutes': minutes
+    } for (user_id, day, category_id, event_type), (count, minutes) in deltas.items() if count or minutes]
+    if not rows:
+        return
+
+    table = DailyRollup.__table__
+    _upsert_counters(connection, table, rows, ['user_id', 'day', 'category_id', 'type'], ['count', 'minutes'])
+
+    # Итоги по пользователю для /telegram/stats
+    summaries = {}
+    for row in rows:
+        summary = summaries.setdefault(row['user_id'], {
+            'user_id': row['user_id'], 'total_events': 0, 'plan_events': 0, 'fact_events': 0
+        })
+        summary['total_events'] += row['count']
+        if row['type'] in ('plan', 'fact'):
+            summary[f"{row['type']}_events"] += row['count']
+    summary_rows = [summary for summary in summaries.values() if any(
+        summary[name] for name in ('total_events', 'plan_events', 'fact_events'))]
+    if summary_rows:
+        _upsert_counters(connection, UserSummary.__table__, summary_rows, ['user_id'],
+                         ['total_events', 'plan_events', 'fact_events'])
+
+    # Убираем опустевшие строки, чтобы они не копились после удалений
+    if any(row['count'] < 0 for row in rows):
+        user_ids = {row['user_id'] for row in rows}
+        connection.execute(table.delete().where(table.c.user_id.in_(user_ids), table.c['count'] <= 0))
+
+
+@event.listens_for(Session, 'before_flush')
+def _track_event_changes(session, flush_context, instances):
+    """Инкрементально обновляет агрегаты при любой записи Event через ORM"""
+    deltas = defaultdict(lambda: [0, 0])
+    with session.no_autoflush:
+        for obj in session.new:
+            if isinstance(obj, Event):
+                add_delta(deltas, _values(obj), 1)
+        for obj in session.dirty:
+            if isinstance(obj, Event) and session.is_modified(obj):
+                add_delta(deltas, _values(obj, old=True), -1)
+                add_delta(deltas, _values(obj), 1)
+        for obj in session.deleted:
+            if isinstance(obj, Event):
+                add_delta(deltas, _values(obj, old=True), -1)
+    if deltas:
+        apply_deltas(session.connection(), deltas)
+
+
+def telegram_summary(user_id, today=None):
+    """Счётчики для /telegram/stats: строка user_summaries + агрегаты за сегодня"""
+    today = today or datetime.now().date()
+    summary = UserSummary.query.get(user_id)
+    today_events = db.session.query(func.coalesce(func.sum(DailyRollup.count), 0)).filter(
+        DailyRollup.user_id == user_id,
+        DailyRollup.day == today
+    ).scalar()
+    return {
+        'today': int(today_events),
+        'total': summary.total_events if summary else 0,
+        'plan': summary.plan_events if summary else 0,
+        'fact': summary.fact_events if summary else 0
+    }
+
+
+def user_stats(user_id, today=None):
+    """Статистика пользователя одним запросом по агрегатам"""
+    today = today or datetime.now().date()
+    r = DailyRollup
+    rows = db.session.query(
+        Category.id, Category.name, Category.color, r.type,
+        func.coalesce(func.sum(r.count), 0),
+        func.coalesce(func.sum(r.minutes), 0),
+        func.coalesce(func.sum(case((r.day == today, r.count), else_=0)), 0),
+        func.coalesce(func.sum(case((r.day >= today, r.count), else_=0)), 0)
+    ).outerjoin(
+        r, (r.category_id == Category.id) & (r.user_id == Category.user_id)
+    ).filter(
+        Category.user_id == user_id
+    ).group_by(Category.id, Category.name, Category.color, r.type).all()
+
+    stats = {
+        'categories': 0,
+        'total_events': 0,
+        'plan_events': 0,
+        'fact_events': 0,
+        'today_events': 0,
+        'upcoming_events': 0,
+        'plan_minutes': 0,
+        'fact_minutes': 0
+    }
+    by_category = {}
+    for category_id, name, color, event_type, count, minutes, today_count, upcoming_count in rows:
+        item = by_category.setdefault(category_id, {
+            'id': category_id,
+            'name': name,
+            'color': color,
+            'plan_events': 0,
+            'fact_events': 0,
+            'plan_minutes': 0,
+            'fact_minutes': 0
+        })
+        if event_type is None:
+            continue
+        stats['total_events'] += count
+        stats['today_events'] += today_count
+        stats['upcoming_events'] += upcoming_count
+        if event_type in ('plan', 'fact'):
+            item[f'{event_type}_events'] += count
+            item[f'{event_type}_minutes'] += minutes
+            stats[f'{event_type}_events'] += count
+            stats[f'{event_type}_minutes'] += minutes
+
+    stats['categories'] = len(by_category)
+    plan_events = stats['plan_events']
+    stats['productivity'] = round(stats['fact_events'] / plan_events * 100, 1) if plan_events > 0 else 0
+    stats['by_category'] = list(by_category.values())
+    return stats
+
+
+def backfill_rollups(user_id=None):
+    """Пересчитать daily_rollups и user_summaries по таблице events; вернуть число строк агрегатов"""
+    rollups = DailyRollup.query
+    summaries = UserSummary.query
+    events = db.session.query(*(getattr(Event, key) for key in _FIELDS))
+    if user_id is not None:
+        rollups = rollups.filter_by(user_id=user_id)
+        summaries = summaries.filter_by(user_id=user_id)
+        events = events.filter(Event.user_id == user_id)
+
+    rollups.delete(synchronize_session=False)
+    summaries.delete(synchronize_session=False)
+
+    deltas = defaultdict(lambda: [0, 0])
+    for row in events.yield_per(1000):
+        add_delta(deltas, tuple(row), 1)
+
+    apply_deltas(db.session.connection(), deltas)
+    db.session.commit()
+    return len(deltas)
+
+
+def rollups_missing():
+    """Агрегатов ещё нет, а события есть - база до появления daily_rollups/user_summaries"""
+    return UserSummary.query.first() is None and Event.query.first() is not None
+
+
+@click.command('backfill-rollups')
+@click.option('--user-id', type=int, default=None, help='Пересчитать только одного пользователя')
+@with_appcontext
+def backfill_rollups_command(user_id):
+    """Пересчитать daily_rollups и user_summaries по таблице events (запускать без параллельной записи)"""
+    click.echo(f'Готово: {backfill_rollups(user_id)} строк агрегатов')
@@ -1,11 +1,18 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify
 from flask_login import login_required
-from app import db
-from app.models import User, Category, Event, Template
-from app.auth import telegram_auth_required
-from datetime import datetime, timedelta
+from app import db, live_updates, week_cache
+from app.models import Category, CategoryAlias, Event, Template, IngestKey
+from app.bulk import bulk_insert_events
+from app.rollups import telegram_summary
+from sqlalchemy.exc import IntegrityError
+from app.auth import telegram_auth_required, resolve_telegram_identity
+from app.versioning import bump_version, etag_versioned
+from app.category_match import category_matchers
+from app.timeparse import parse_duration, parse_time_input
+from app.sync import parse_sync_request, sync_changes
+from datetime import datetime
 from flask_login import current_user
-import re
+import time
 
 api_bp = Blueprint('api', __name__, url_prefix='/api/v1')
 
@@ -21,7 +28,7 @@ def telegram_auth():
         return jsonify({'error': 'telegram_id required'}), 400
     
     # Ищем пользователя
-    user = User.query.filter_by(telegram_id=telegram_id).first()
+    user = resolve_telegram_identity(telegram_id)
     
     if user:
         # Пользователь уже существует
@@ -29,7 +36,7 @@ def telegram_auth():
             'status': 'authenticated',
             'user_id': user.id,
             'username': user.username,
-            'has_categories': Category.query.filter_by(user_id=user.id).count() > 0
+            'has_categories': bool(user.has_categories)
         }), 200
     else:
         # Новый пользователь - нужно зарегистрироваться через веб
@@ -41,17 +48,23 @@ def telegram_auth():
 
 @api_bp.route('/telegram/categories', methods=['GET'])
 @telegram_auth_required
+@etag_versioned('categories')
 def telegram_categories():
     """Получить категории пользователя для Telegram-бота"""
     user = request.current_user
     categories = Category.query.filter_by(user_id=user.id).all()
+    aliases = {}
+    for category_id, alias in db.session.query(CategoryAlias.category_id, CategoryAlias.alias).filter(
+            CategoryAlias.user_id == user.id):
+        aliases.setdefault(category_id, []).append(alias)
     
     # Формат для inline-клавиатуры Telegram
     return jsonify({
         'categories': [{
             'id': cat.id,
             'name': cat.name,
-            'color': cat.color
+            'color': cat.color,
+            'aliases': sorted(aliases.get(cat.id, []))
         } for cat in categories],
         'quick_replies': [
             {'text': cat.name, 'callback_data': f'cat_{cat.id}'}
@@ -71,18 +84,9 @@ def telegram_create_event():
     category_id = data.get('category_id')
     event_type = data.get('type', 'fact')  # По умолчанию факт
     
-    # Парсинг времени (пример: "14:30-16:00" или "2 часа")
+    # Парсинг времени (пример: "14:30-16:00", "2 часа" или "1h30m")
     try:
-        if '-' in time_input:
-            # Формат "14:30-16:00"
-            start_str, end_str = time_input.split('-')
-            start_time = parse_time(start_str.strip())
-            end_time = parse_time(end_str.strip())
-        else:
-            # Формат "2 часа" или "90 минут"
-            duration = parse_duration(time_input)
-            start_time = datetime.utcnow()
-            end_time = start_time + duration
+        start_time, end_time = parse_time_input(str(time_input))
     except ValueError as e:
         return jsonify({'error': f'Invalid time format: {str(e)}'}), 400
     
@@ -106,7 +110,9 @@ def telegram_create_event():
     )
     
     db.session.add(event)
+    bump_version(user.id, 'events')
     db.session.commit()
+    week_cache.invalidate(user.id, event.start_time)
     
     return jsonify({
         'status': 'success',
@@ -122,63 +128,204 @@ def telegram_quick_event():
     data = request.json
     
     code = data.get('code')  # Например, "ПАРА" или "ОБЕД"
-    duration_minutes = data.get('duration', 90)  # По умолчанию 1,5 час
+    try:
+        # Минуты числом или строкой ("1h30m", "полтора часа"); по умолчанию 1,5 часа
+        duration = parse_duration(data.get('duration', 90))
+    except ValueError as e:
+        return jsonify({'error': f'Invalid duration: {str(e)}'}), 400
+    duration_minutes = int(duration.total_seconds() // 60)
     
-    # Ищем категорию по коду/сокращению
-    category = Category.query.filter_by(user_id=user.id).filter(
-        (Category.name.ilike(f'%{code}%')) |
-        (db.func.lower(Category.name) == code.lower())
-    ).first()
+    # Ищем категорию по коду/сокращению (точное, префикс, подстрока)
+    match = category_matchers.match(user.id, code or '')
     
-    if not category:
+    if not match:
         return jsonify({'error': f'Category not found for code: {code}'}), 404
+    category_id, category_name = match
     
     # Создаем событие
     start_time = datetime.utcnow()
-    end_time = start_time + timedelta(minutes=int(duration_minutes))
+    end_time = start_time + duration
     
     event = Event(
         user_id=user.id,
-        category_id=category.id,
+        category_id=category_id,
         type='fact',
         start_time=start_time,
         end_time=end_time,
-        source='telegram_quick'
+        source='tg_quick'  # source ограничен 10 символами
     )
     
     db.session.add(event)
+    bump_version(user.id, 'events')
     db.session.commit()
+    week_cache.invalidate(user.id, event.start_time)
     
     return jsonify({
         'status': 'success',
-        'category': category.name,
+        'category': category_name,
         'duration': duration_minutes
     })
 
-# Вспомогательные функции для парсинга времени
-def parse_time(time_str):
-    """Парсинг времени в формате '14:30' или '2:30 PM'"""
-    # Простая реализация
-    if ':' in time_str:
-        hours, minutes = map(int, time_str.split(':'))
-        now = datetime.utcnow()
-        return now.replace(hour=hours % 24, minute=minutes, second=0, microsecond=0)
-    raise ValueError(f"Can't parse time: {time_str}")
-
-def parse_duration(duration_str):
-    """Парсинг длительности '2 часа', '90 минут' и т.д."""
-    duration_str = duration_str.lower()
-    
-    if 'час' in duration_str or 'hour' in duration_str:
-        hours = float(re.search(r'[\d.]+', duration_str).group())
-        return timedelta(hours=hours)
-    elif 'мин' in duration_str or 'min' in duration_str:
-        minutes = float(re.search(r'[\d.]+', duration_str).group())
-        return timedelta(minutes=minutes)
-    else:
-        # По умолчанию считаем минутами
-        minutes = float(re.search(r'[\d.]+', duration_str).group())
-        return timedelta(minutes=minutes)
+@api_bp.route('/telegram/stats', methods=['GET'])
+@telegram_auth_required
+def telegram_stats():
+    """Статистика для команды /stats бота (из предрасчитанной сводки)"""
+    user = request.current_user
+    return jsonify(telegram_summary(user.id))
+
+
+@api_bp.route('/sync', methods=['GET'])
+@login_required
+def sync():
+    """Изменения после курсора: ?since=<cursor>&types=events,categories,templates"""
+    return _sync_response(current_user.id)
+
+
+@api_bp.route('/telegram/sync', methods=['GET'])
+@telegram_auth_required
+def telegram_sync():
+    """То же для бота (авторизация по X-Telegram-ID)"""
+    return _sync_response(request.current_user.id)
+
+
+def _sync_response(user_id):
+    try:
+        since, kinds = parse_sync_request(request.args)
+    except ValueError:
+        return jsonify({'error': 'Invalid since cursor or types'}), 400
+    return jsonify(sync_changes(user_id, since, kinds))
+
+
+# Комментарий-пинг держит соединение через прокси и выявляет закрытые вкладки
+STREAM_KEEPALIVE = 15
+STREAM_RETRY_MS = 3000
+
+
+@api_bp.route('/stream', methods=['GET'])
+@login_required
+def stream():
+    """SSE-поток изменений событий, категорий и шаблонов текущего пользователя
+
+    Каждое сообщение `change` - дельта вида {events: {upsert: [...], deleted: [...]}, ...};
+    `resync` - клиент отстал или переподключился, нужен запрос к /sync.
+    """
+    subscription = live_updates.subscribe(current_user.id, limit=current_app.config.get('LIVE_STREAM_MAX'))
+    if subscription is None:
+        return jsonify({'error': 'Too many live streams'}), 503, {'Retry-After': '30'}
+
+    # Генератор работает после выхода из контекста запроса - всё нужное берём заранее
+    dumps = current_app.json.dumps
+    deadline = time.monotonic() + current_app.config.get('LIVE_STREAM_LIFETIME', 300)
+
+    def generate():
+        try:
+            yield f'retry: {STREAM_RETRY_MS}\n\n'
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                message = subscription.get(timeout=min(STREAM_KEEPALIVE, remaining))
+                if message is None:
+                    yield ': ping\n\n'
+                elif message.get('resync'):
+                    yield 'event: resync\ndata: {}\n\n'
+                else:
+                    yield f'event: change\ndata: {dumps(message)}\n\n'
+        finally:
+            # Срабатывает и при обрыве соединения (GeneratorExit на очередном yield)
+            live_updates.unsubscribe(subscription)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+MAX_QUICK_BATCH = 200
+
+
+@api_bp.route('/telegram/quick/batch', methods=['POST'])
+@telegram_auth_required
+def telegram_quick_batch():
+    """Пакетная загрузка быстрых событий из очереди бота (идемпотентно по key)"""
+    user = request.current_user
+    data = request.get_json(silent=True) or {}
+    items = data.get('events')
+    
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'events required'}), 400
+    if len(items) > MAX_QUICK_BATCH:
+        return jsonify({'error': f'At most {MAX_QUICK_BATCH} events per batch'}), 400
+    
+    keys = [str(item.get('key', '')) if isinstance(item, dict) else '' for item in items]
+    if not all(keys) or any(len(key) > 64 for key in keys):
+        return jsonify({'error': 'Every event needs a key (up to 64 chars)'}), 400
+    
+    # Уже обработанные ключи - одним запросом
+    seen = {
+        key: event_id for key, event_id in db.session.query(IngestKey.key, IngestKey.event_id).filter(
+            IngestKey.user_id == user.id,
+            IngestKey.key.in_(keys)
+        )
+    }
+    matches = category_matchers.match_many(user.id, [item.get('code', '') for item in items])
+    now = datetime.utcnow()
+    
+    results = []
+    rows = []
+    pending = []
+    for item, key, match in zip(items, keys, matches):
+        if key in seen:
+            results.append({'key': key, 'status': 'duplicate', 'event_id': seen[key]})
+            continue
+        seen[key] = None
+        
+        if not match:
+            results.append({'key': key, 'status': 'error', 'error': f'Category not found for code: {item.get("code")}'})
+            continue
+        
+        try:
+            duration = parse_duration(item.get('duration', 90))
+            duration_minutes = int(duration.total_seconds() // 60)
+            sent_at = item.get('sent_at')
+            start_time = datetime.utcfromtimestamp(float(sent_at)) if sent_at else now
+        except (TypeError, ValueError, OverflowError):
+            results.append({'key': key, 'status': 'error', 'error': 'Invalid duration or sent_at'})
+            continue
+        start_time = min(start_time, now)
+        
+        rows.append({
+            'user_id': user.id,
+            'category_id': match[0],
+            'type': 'fact',
+            'start_time': start_time,
+            'end_time': start_time + duration,
+            'source': 'tg_quick'
+        })
+        result = {'key': key, 'status': 'created', 'category': match[1], 'duration': duration_minutes}
+        results.append(result)
+        pending.append(result)
+    
+    if rows:
+        try:
+            ids = bulk_insert_events(rows)
+            db.session.add_all([
+                IngestKey(user_id=user.id, key=result['key'], event_id=event_id)
+                for result, event_id in zip(pending, ids)
+            ])
+            bump_version(user.id, 'events')
+            db.session.commit()
+        except IntegrityError:
+            # Тот же ключ пришёл параллельным запросом - бот повторит пакет позже
+            db.session.rollback()
+            return jsonify({'error': 'Concurrent batch with the same keys, retry later'}), 409
+        
+        week_cache.invalidate(user.id, *(row['start_time'] for row in rows))
+        for result, event_id in zip(pending, ids):
+            result['event_id'] = event_id
+    
+    return jsonify({'status': 'success', 'results': results})
+
 
 @api_bp.route('/templates/<int:template_id>', methods=['DELETE'])
 @login_required
@@ -193,6 +340,7 @@ def delete_template(template_id):
         return jsonify({'status': 'error', 'message': 'Шаблон не найден'}), 404
     
     db.session.delete(template)
+    bump_version(current_user.id, 'templates')
     db.session.commit()
     
     return jsonify({'status': 'success', 'message': 'Шаблон удален'})
@@ -1,13 +1,37 @@
 # app/routes/main_routes.py
-from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for
+from flask import Blueprint, current_app, g, render_template, request, jsonify, flash, redirect, url_for, Response, stream_with_context
 from flask_login import login_user, logout_user, current_user, login_required
-from app import db
-from app.models import User, Category, Event, Template
+from app import db, live_updates, replica_router, request_metrics, week_cache
+from app.models import User, Category, CategoryAlias, Event, Template
+from app.versioning import bump_version, etag_versioned
+from app.rollups import user_stats
+from app.bulk import bulk_insert_events
+from app.template_apply import CONFLICT_POLICIES, expand_template, plan_application
+from app.overlap import OverlapChecker, find_overlap
+from app.timeparse import parse_datetime
+from app.sync import encode_sync_cursor
+from app.serializers import EVENT_TYPES, dumps_line, event_dict, event_row_dict, event_rows, events_columnar, iso_z, week_event_dict
+from app.category_match import MAX_ALIAS_LENGTH, category_matchers, normalize_code
+from app.pool import pool_metrics, pool_stats
+from app.replica import REPLICA_BIND, replica_used, use_primary
+from app.auth import invalidate_telegram_identity, session_users, telegram_identities
 from datetime import datetime, timedelta
-import json
+from sqlalchemy import tuple_
+from sqlalchemy.exc import IntegrityError
+from types import SimpleNamespace
+import base64
+import logging
 
 # Создаем основной Blueprint
 main_bp = Blueprint('main', __name__)
+logger = logging.getLogger(__name__)
+
+# Размеры страниц для /api/events
+DEFAULT_PAGE_SIZE = 200
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 500
+MAX_BATCH_EVENTS = 1000
+MAX_TEMPLATE_WEEKS = 12
 
 # ==================== МАРШРУТЫ АУТЕНТИФИКАЦИИ ====================
 
@@ -85,6 +109,7 @@ def register():
         
         db.session.add(user)
         db.session.commit()
+        invalidate_telegram_identity(user.telegram_id)
         
         flash('Регистрация успешна! Теперь вы можете войти.', 'success')
         return redirect(url_for('main.login'))
@@ -143,19 +168,15 @@ def schedule():
 @login_required
 def profile():
     """Страница профиля пользователя"""
-    # Получаем статистику пользователя
-    categories_count = Category.query.filter_by(user_id=current_user.id).count()
-    events_count = Event.query.filter_by(user_id=current_user.id).count()
-    today_events = Event.query.filter(
-        Event.user_id == current_user.id,
-        Event.start_time >= datetime.now().date()
-    ).count()
+    # Получаем статистику пользователя (из агрегатов daily_rollups)
+    stats = user_stats(current_user.id)
     
     return render_template('profile.html', 
                           user=current_user,
-                          categories_count=categories_count,
-                          events_count=events_count,
-                          today_events=today_events)
+                          stats=stats,
+                          categories_count=stats['categories'],
+                          events_count=stats['total_events'],
+                          today_events=stats['upcoming_events'])
 
 
 @main_bp.route('/categories')
@@ -172,6 +193,7 @@ def categories_page():
 @main_bp.route('/api/v1/categories', methods=['GET'])
 @main_bp.route('/api/categories', methods=['GET'])  # Поддержка двух версий
 @login_required
+@etag_versioned('categories')
 def get_categories_api():
     """Получить все категории текущего пользователя"""
     categories = Category.query.filter_by(user_id=current_user.id).all()
@@ -179,7 +201,7 @@ def get_categories_api():
         'id': cat.id,
         'name': cat.name,
         'color': cat.color,
-        'is_default': cat.is_default
+        'is_default': False  # В модели нет такого поля, оставлено для фронтенда
     } for cat in categories])
 
 
@@ -190,7 +212,7 @@ def create_category_api():
     try:
         # 1. Получаем данные с проверкой
         data = request.get_json()
-        print(f"DEBUG CREATE CATEGORY: Данные от фронтенда: {data}")
+        logger.debug('Создание категории: данные %s', data)
         
         if not data:
             return jsonify({'error': 'Нет данных'}), 400
@@ -199,10 +221,7 @@ def create_category_api():
         if not name:
             return jsonify({'error': 'Название категории обязательно'}), 400
         
-        # 2. Проверяем пользователя
-        print(f"DEBUG: Текущий пользователь ID: {current_user.id}, имя: {current_user.username}")
-        
-        # 3. Проверяем уникальность (поиск по user_id + name)
+        # 2. Проверяем уникальность (поиск по user_id + name)
         existing = Category.query.filter_by(
             user_id=current_user.id,
             name=name
@@ -214,7 +233,12 @@ def create_category_api():
                 'existing_id': existing.id
             }), 409
         
-        # 4. СОЗДАЕМ категорию
+        # Название участвует в поиске по коду наравне с короткими кодами
+        conflict = _code_conflict(current_user.id, normalize_code(name))
+        if conflict:
+            return jsonify({'error': conflict}), 409
+        
+        # 3. СОЗДАЕМ категорию
         category = Category(
             user_id=current_user.id,
             name=name,
@@ -222,18 +246,17 @@ def create_category_api():
         )
         
         db.session.add(category)
+        bump_version(current_user.id, 'categories')
         db.session.flush()  # Получаем ID без коммита
-        print(f"DEBUG: Категория создана (пока не сохранена). ID: {category.id}")
         
-        # 5. КОММИТИМ транзакцию
+        # 4. КОММИТИМ транзакцию
         db.session.commit()
-        print(f"DEBUG: Транзакция ЗАКОММИТЕНА! Категория {category.id} сохранена в БД")
+        invalidate_telegram_identity(current_user.telegram_id)
+        category_matchers.changed(current_user.id, lambda matcher: matcher.add(category.id, name))
+        logger.info('Категория %s создана пользователем %s', category.id, current_user.id,
+                    extra={'category_id': category.id, 'user_id': current_user.id})
         
-        # 6. ПРОВЕРЯЕМ, что категория реально есть в БД
-        category_check = Category.query.filter_by(id=category.id).first()
-        print(f"DEBUG: Проверка после коммита: категория найдена? {bool(category_check)}")
-        
-        # 7. Возвращаем УСПЕШНЫЙ ответ
+        # 5. Возвращаем УСПЕШНЫЙ ответ
         return jsonify({
             'success': True,
             'message': f'Категория "{name}" создана',
@@ -246,9 +269,7 @@ def create_category_api():
         }), 201
         
     except Exception as e:
-        print(f"DEBUG: ОШИБКА при создании категории: {str(e)}")
-        import traceback
-        print(traceback.format_exc())  # Полный traceback
+        logger.exception('Ошибка при создании категории')
         db.session.rollback()
         return jsonify({'error': f'Ошибка сервера: {str(e)}'}), 500
 
@@ -285,7 +306,90 @@ def delete_category_api(category_id):
         return jsonify({'error': 'Категория не найдена'}), 404
     
     db.session.delete(category)
+    bump_version(current_user.id, 'categories')
     db.session.commit()
+    invalidate_telegram_identity(current_user.telegram_id)
+    category_matchers.changed(current_user.id, lambda matcher: matcher.remove(category_id))
+    
+    return jsonify({'success': True})
+
+
+# --- Короткие коды категорий (для быстрого ввода из бота) ---
+def _code_conflict(user_id, code, exclude_category_id=None):
+    """Текст ошибки, если code уже занят названием или кодом категории; иначе None
+
+    Сравнение в Python через normalize_code - как в CategoryMatcher (ё = е,
+    пробелы, регистр кириллицы, который lower() в SQLite не понимает).
+    """
+    for category_id, name in db.session.query(Category.id, Category.name).filter(Category.user_id == user_id):
+        if category_id != exclude_category_id and normalize_code(name) == code:
+            return f'Код "{code}" совпадает с названием категории "{name}"'
+    if CategoryAlias.query.filter_by(user_id=user_id, alias=code).first():
+        return f'Код "{code}" уже используется'
+    return None
+
+
+@main_bp.route('/api/categories/<int:category_id>/aliases', methods=['GET'])
+@login_required
+def get_category_aliases_api(category_id):
+    """Короткие коды категории"""
+    aliases = CategoryAlias.query.filter_by(
+        category_id=category_id,
+        user_id=current_user.id
+    ).order_by(CategoryAlias.alias).all()
+    return jsonify([alias.to_dict() for alias in aliases])
+
+
+@main_bp.route('/api/categories/<int:category_id>/aliases', methods=['POST'])
+@login_required
+def create_category_alias_api(category_id):
+    """Добавить короткий код категории (например, "ПАРА")"""
+    category = Category.query.filter_by(id=category_id, user_id=current_user.id).first()
+    if not category:
+        return jsonify({'error': 'Категория не найдена'}), 404
+    
+    data = request.get_json(silent=True) or {}
+    alias = normalize_code(data.get('alias', ''))
+    if not alias or len(alias) > MAX_ALIAS_LENGTH:
+        return jsonify({'error': f'Код обязателен (до {MAX_ALIAS_LENGTH} символов)'}), 400
+    
+    # Код не должен совпадать с названием другой категории - точное название важнее
+    conflict = _code_conflict(current_user.id, alias, exclude_category_id=category_id)
+    if conflict:
+        return jsonify({'error': conflict}), 409
+    
+    category_alias = CategoryAlias(user_id=current_user.id, category_id=category_id, alias=alias)
+    db.session.add(category_alias)
+    category.updated_at = datetime.utcnow()  # коды приходят клиентам вместе с категорией через /sync
+    bump_version(current_user.id, 'categories')
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': f'Код "{alias}" уже используется'}), 409
+    category_matchers.changed(current_user.id, lambda matcher: matcher.add_alias(category_id, alias))
+    
+    return jsonify(category_alias.to_dict()), 201
+
+
+@main_bp.route('/api/categories/<int:category_id>/aliases/<int:alias_id>', methods=['DELETE'])
+@login_required
+def delete_category_alias_api(category_id, alias_id):
+    """Удалить короткий код категории"""
+    category_alias = CategoryAlias.query.filter_by(
+        id=alias_id,
+        category_id=category_id,
+        user_id=current_user.id
+    ).first()
+    if not category_alias:
+        return jsonify({'error': 'Код не найден'}), 404
+    
+    alias = category_alias.alias
+    db.session.delete(category_alias)
+    category_alias.category.updated_at = datetime.utcnow()
+    bump_version(current_user.id, 'categories')
+    db.session.commit()
+    category_matchers.changed(current_user.id, lambda matcher: matcher.remove_alias(category_id, alias))
     
     return jsonify({'success': True})
 
@@ -293,6 +397,7 @@ def delete_category_api(category_id):
 # --- События ---
 @main_bp.route('/api/events', methods=['GET'])
 @login_required
+@etag_versioned('events', 'categories')
 def get_events_api():
     """Получить события с фильтрацией"""
     # Параметры фильтрации
@@ -300,20 +405,23 @@ def get_events_api():
     end_date = request.args.get('end_date')
     category_id = request.args.get('category_id')
     
-    # Базовый запрос
-    query = Event.query.filter_by(user_id=current_user.id)
+    output = request.args.get('format')  # ndjson, columnar или обычный JSON
+    start_dt = None
+    
+    # Базовый запрос: строки-кортежи вместе с категорией, без ORM-объектов
+    query = event_rows(Event.user_id == current_user.id)
     
     # Применяем фильтры
     if start_date:
         try:
-            start_dt = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
+            start_dt = parse_datetime(start_date)
             query = query.filter(Event.start_time >= start_dt)
         except ValueError:
             return jsonify({'error': 'Неверный формат начальной даты'}), 400
     
     if end_date:
         try:
-            end_dt = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
+            end_dt = parse_datetime(end_date)
             query = query.filter(Event.end_time <= end_dt)
         except ValueError:
             return jsonify({'error': 'Неверный формат конечной даты'}), 400
@@ -321,19 +429,71 @@ def get_events_api():
     if category_id:
         query = query.filter(Event.category_id == category_id)
     
-    # Выполняем запрос
-    events = query.order_by(Event.start_time).all()
+    # Keyset-пагинация по (start_time, id)
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            cursor_start, cursor_id = _decode_cursor(cursor)
+        except ValueError:
+            return jsonify({'error': 'Неверный курсор'}), 400
+        query = query.filter(tuple_(Event.start_time, Event.id) > tuple_(cursor_start, cursor_id))
     
-    return jsonify([{
-        'id': e.id,
-        'category_id': e.category_id,
-        'category_name': e.category.name if e.category else '',
-        'category_color': e.category.color if e.category else '#4361ee',
-        'start_time': e.start_time.isoformat() + 'Z' if e.start_time else None,
-        'end_time': e.end_time.isoformat() + 'Z' if e.end_time else None,
-        'type': e.type,
-        'source': e.source
-    } for e in events])
+    query = query.order_by(Event.start_time, Event.id)
+    
+    # Потоковая выдача NDJSON: строки читаются курсором на сервере пачками
+    if output == 'ndjson':
+        def generate():
+            for row in query.yield_per(STREAM_BATCH_SIZE):
+                yield dumps_line(event_row_dict(row))
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    
+    limit = request.args.get('limit', type=int)
+    if limit is None and not cursor:
+        rows = query.all()
+        if output == 'columnar':
+            return jsonify(events_columnar(rows, _columnar_origin(start_dt, rows)))
+        # Старый формат ответа: весь список
+        return jsonify([event_row_dict(row) for row in rows])
+    
+    limit = max(1, min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+    events = query.limit(limit + 1).all()
+    has_more = len(events) > limit
+    events = events[:limit]
+    next_cursor = _encode_cursor(events[-1]) if has_more else None
+    
+    if output == 'columnar':
+        page = events_columnar(events, _columnar_origin(start_dt, events))
+        page['next_cursor'] = next_cursor
+        return jsonify(page)
+    
+    return jsonify({
+        'events': [event_row_dict(row) for row in events],
+        'next_cursor': next_cursor
+    })
+
+
+def _columnar_origin(start_dt, rows):
+    """Точка отсчёта смещений: start_date запроса или полночь дня первого события"""
+    if start_dt is not None:
+        return start_dt
+    if rows:
+        return datetime.combine(rows[0].start_time.date(), datetime.min.time())
+    return None
+
+
+def _encode_cursor(event):
+    """Непрозрачный курсор: позиция последнего события на странице"""
+    raw = f'{event.start_time.isoformat()}|{event.id}'
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def _decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        start_str, event_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(start_str), int(event_id)
+    except (UnicodeError, ValueError, TypeError) as e:
+        raise ValueError(str(e))
 
 
 @main_bp.route('/api/v1/events', methods=['POST'])
@@ -363,42 +523,20 @@ def create_event_api():
         start_str = data['start_time']
         end_str = data['end_time']
         
-        # Отладочная информация
-        print(f"DEBUG: Получено start_time: {start_str}")
-        print(f"DEBUG: Получено end_time: {end_str}")
-        
         try:
-            # Формат 1: '2024-01-01 14:30:00' (наш фронтенд)
-            if ' ' in start_str and 'T' not in start_str:
-                start_time = datetime.strptime(start_str, '%Y-%m-%d %H:%M:%S')
-                end_time = datetime.strptime(end_str, '%Y-%m-%d %H:%M:%S')
-            # Формат 2: ISO с 'Z' или без
-            else:
-                # Убираем 'Z' если есть и добавляем +00:00 для UTC
-                start_str_clean = start_str.replace('Z', '+00:00').replace(' ', 'T')
-                end_str_clean = end_str.replace('Z', '+00:00').replace(' ', 'T')
-                start_time = datetime.fromisoformat(start_str_clean)
-                end_time = datetime.fromisoformat(end_str_clean)
-                
+            # '2024-01-01 14:30:00' (наш фронтенд) или ISO с 'Z'/смещением
+            start_time = parse_datetime(start_str)
+            end_time = parse_datetime(end_str)
         except ValueError as e:
-            print(f"DEBUG: Ошибка парсинга времени: {e}")
+            logger.debug('Неверное время события: %s - %s (%s)', start_str, end_str, e)
             return jsonify({'error': f'Неверный формат времени. Используйте формат "YYYY-MM-DD HH:MM:SS". Получено: {start_str}'}), 400
         
         # Проверяем, что конец позже начала
         if end_time <= start_time:
             return jsonify({'error': 'Время окончания должно быть позже времени начала'}), 400
         
-        print(f"DEBUG: Парсинг успешен. start_time: {start_time}, end_time: {end_time}")
-        
         # Проверяем, нет ли перекрывающихся событий (опционально)
-        overlapping_event = Event.query.filter(
-            Event.user_id == current_user.id,
-            Event.start_time < end_time,
-            Event.end_time > start_time,
-            Event.type == data['type']
-        ).first()
-        
-        if overlapping_event:
+        if find_overlap(current_user.id, data['type'], start_time, end_time):
             return jsonify({'error': 'Событие перекрывается с существующим'}), 400
         
         # Создаем новое событие
@@ -412,28 +550,21 @@ def create_event_api():
         )
         
         db.session.add(new_event)
+        bump_version(current_user.id, 'events')
         db.session.commit()
+        week_cache.invalidate(current_user.id, new_event.start_time)
         
-        print(f"DEBUG: Событие создано. ID: {new_event.id}")
+        logger.debug('Событие %s создано: %s - %s', new_event.id, start_time, end_time)
         
         # Возвращаем полную информацию о событии
         return jsonify({
             'success': True,
             'message': 'Событие создано',
-            'event': {
-                'id': new_event.id,
-                'category_id': new_event.category_id,
-                'start_time': new_event.start_time.isoformat() + 'Z',
-                'end_time': new_event.end_time.isoformat() + 'Z',
-                'type': new_event.type,
-                'source': new_event.source
-            }
+            'event': event_dict(new_event)
         }), 201
         
     except Exception as e:
-        print(f"DEBUG: Ошибка в create_event_api: {str(e)}")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception('Ошибка в create_event_api')
         db.session.rollback()
         return jsonify({'error': f'Ошибка сервера: {str(e)}'}), 500
 
@@ -450,8 +581,11 @@ def delete_event_api(event_id):
     if not event:
         return jsonify({'error': 'Событие не найдено'}), 404
     
+    start_time = event.start_time
     db.session.delete(event)
+    bump_version(current_user.id, 'events')
     db.session.commit()
+    week_cache.invalidate(current_user.id, start_time)
     
     return jsonify({'success': True})
 
@@ -471,6 +605,7 @@ def update_event_api(event_id):
             return jsonify({'error': 'Событие не найдено'}), 404
         
         data = request.get_json()
+        old_start_time = event.start_time
         
         # Обновляем поля если они переданы
         if 'category_id' in data:
@@ -483,21 +618,14 @@ def update_event_api(event_id):
                 return jsonify({'error': 'Категория не найдена'}), 404
             event.category_id = data['category_id']
         
-        if 'start_time' in data:
-            start_str = data['start_time']
-            if ' ' in start_str and 'T' not in start_str:
-                event.start_time = datetime.strptime(start_str, '%Y-%m-%d %H:%M:%S')
-            else:
-                start_str_clean = start_str.replace('Z', '+00:00').replace(' ', 'T')
-                event.start_time = datetime.fromisoformat(start_str_clean)
-        
-        if 'end_time' in data:
-            end_str = data['end_time']
-            if ' ' in end_str and 'T' not in end_str:
-                event.end_time = datetime.strptime(end_str, '%Y-%m-%d %H:%M:%S')
-            else:
-                end_str_clean = end_str.replace('Z', '+00:00').replace(' ', 'T')
-                event.end_time = datetime.fromisoformat(end_str_clean)
+        try:
+            if 'start_time' in data:
+                event.start_time = parse_datetime(data['start_time'])
+            if 'end_time' in data:
+                event.end_time = parse_datetime(data['end_time'])
+        except ValueError:
+            db.session.rollback()
+            return jsonify({'error': 'Неверный формат времени. Используйте формат "YYYY-MM-DD HH:MM:SS"'}), 400
         
         if 'type' in data:
             event.type = data['type']
@@ -506,30 +634,134 @@ def update_event_api(event_id):
         if event.end_time <= event.start_time:
             return jsonify({'error': 'Время окончания должно быть позже времени начала'}), 400
         
+        with db.session.no_autoflush:
+            overlapping_id = find_overlap(current_user.id, event.type, event.start_time, event.end_time,
+                                          exclude_id=event.id)
+        if overlapping_id:
+            db.session.rollback()
+            return jsonify({'error': 'Событие перекрывается с существующим'}), 400
+        
+        bump_version(current_user.id, 'events')
         db.session.commit()
+        week_cache.invalidate(current_user.id, old_start_time, event.start_time)
         
         return jsonify({
             'success': True,
             'message': 'Событие обновлено',
-            'event': {
-                'id': event.id,
-                'category_id': event.category_id,
-                'start_time': event.start_time.isoformat() + 'Z',
-                'end_time': event.end_time.isoformat() + 'Z',
-                'type': event.type
-            }
+            'event': event_dict(event)
         }), 200
         
     except Exception as e:
-        print(f"DEBUG: Ошибка в update_event_api: {str(e)}")
+        logger.exception('Ошибка в update_event_api')
         db.session.rollback()
         return jsonify({'error': f'Ошибка сервера: {str(e)}'}), 500
 
 
+@main_bp.route('/api/v1/events/batch', methods=['POST'])
+@main_bp.route('/api/events/batch', methods=['POST'])
+@login_required
+def create_events_batch_api():
+    """Создать несколько событий одной транзакцией (результат по каждому элементу)"""
+    data = request.get_json(silent=True)
+    items = data.get('events') if isinstance(data, dict) else data
+    
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'Ожидается непустой массив events'}), 400
+    if len(items) > MAX_BATCH_EVENTS:
+        return jsonify({'error': f'Не более {MAX_BATCH_EVENTS} событий за запрос'}), 400
+    
+    results = [None] * len(items)
+    parsed = []
+    now = datetime.utcnow()
+    
+    # 1. Проверяем и парсим каждый элемент без обращений к БД
+    required_fields = ['category_id', 'start_time', 'end_time', 'type']
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[index] = {'index': index, 'status': 'error', 'error': 'Ожидается объект'}
+            continue
+        missing = [field for field in required_fields if field not in item]
+        if missing:
+            results[index] = {'index': index, 'status': 'error',
+                              'error': f'Отсутствуют обязательные поля: {", ".join(missing)}'}
+            continue
+        if not isinstance(item['type'], str) or item['type'] not in EVENT_TYPES:
+            results[index] = {'index': index, 'status': 'error',
+                              'error': f'Тип события должен быть одним из: {", ".join(EVENT_TYPES)}'}
+            continue
+        try:
+            row = {
+                'user_id': current_user.id,
+                'category_id': int(item['category_id']),
+                'start_time': parse_datetime(item['start_time']),
+                'end_time': parse_datetime(item['end_time']),
+                'type': item['type'],
+                'source': 'web',
+                'created_at': now
+            }
+        except (TypeError, ValueError):
+            results[index] = {'index': index, 'status': 'error', 'error': 'Неверный формат времени или категории'}
+            continue
+        if row['end_time'] <= row['start_time']:
+            results[index] = {'index': index, 'status': 'error',
+                              'error': 'Время окончания должно быть позже времени начала'}
+            continue
+        parsed.append((index, row))
+    
+    # 2. Категории: один запрос на все различные category_id
+    category_ids = {row['category_id'] for _, row in parsed}
+    owned_categories = {
+        category_id for (category_id,) in db.session.query(Category.id).filter(
+            Category.user_id == current_user.id,
+            Category.id.in_(category_ids)
+        )
+    } if category_ids else set()
+    
+    # 3. Перекрытия: один интервальный запрос на весь диапазон пачки
+    busy = OverlapChecker.load(current_user.id, [row for _, row in parsed])
+    
+    accepted = []
+    for index, row in parsed:
+        if row['category_id'] not in owned_categories:
+            results[index] = {'index': index, 'status': 'error', 'error': 'Категория не найдена'}
+        elif busy.find(row['type'], row['start_time'], row['end_time']):
+            results[index] = {'index': index, 'status': 'error', 'error': 'Событие перекрывается с существующим'}
+        else:
+            busy.add(row['type'], row['start_time'], row['end_time'])
+            accepted.append((index, row))
+    
+    # 4. Вставка одной транзакцией
+    if accepted:
+        try:
+            ids = bulk_insert_events([row for _, row in accepted])
+            bump_version(current_user.id, 'events')
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'error': f'Ошибка сервера: {str(e)}'}), 500
+        
+        week_cache.invalidate(current_user.id, *(row['start_time'] for _, row in accepted))
+        
+        for (index, row), event_id in zip(accepted, ids):
+            results[index] = {
+                'index': index,
+                'status': 'created',
+                'event': event_dict(SimpleNamespace(id=event_id, **row))
+            }
+    
+    return jsonify({
+        'success': bool(accepted),
+        'created': len(accepted),
+        'failed': len(items) - len(accepted),
+        'results': results
+    }), 201 if accepted else 400
+
+
 # --- События по неделям ---
 @main_bp.route('/api/v1/events/week/<week_id>', methods=['GET'])
 @main_bp.route('/api/events/week/<week_id>', methods=['GET'])  # Поддержка двух версий
 @login_required
+@etag_versioned('events', 'categories')
 def get_week_events_api(week_id):
     """Получить события за неделю"""
     try:
@@ -538,43 +770,34 @@ def get_week_events_api(week_id):
         year = int(year_str)
         week = int(week_str)
         
-        # Получаем даты недели
-        from datetime import datetime, timedelta
-        
-        # Простой расчет недели
-        jan1 = datetime(year, 1, 1)
-        start_date = jan1 + timedelta(days=(week - 1) * 7 - jan1.weekday())
+        # Получаем даты недели (ISO: неделя начинается с понедельника)
+        start_date = datetime.fromisocalendar(year, week, 1)
         end_date = start_date + timedelta(days=7)
+        week_key = f"{year}-W{week:02d}"
+        
+        # format=columnar - параллельные массивы вместо списка объектов
+        columnar = request.args.get('format') == 'columnar'
+        variant = 'columnar' if columnar else None
         
-        print(f"DEBUG: Загрузка событий для недели {week_id}")
-        print(f"DEBUG: Диапазон: {start_date} - {end_date}")
+        # Версии из etag_versioned: кэш и ETag согласованы по одним и тем же данным
+        versions = g.etag_versions
+        cached = week_cache.get(current_user.id, week_key, variant, versions)
+        if cached is not None:
+            return jsonify(cached)
         
-        # Получаем события за неделю
-        events = Event.query.filter(
+        # Курсор для /api/v1/sync - берётся до чтения, чтобы не пропустить изменения
+        sync_cursor = encode_sync_cursor(datetime.utcnow())
+        
+        # События за неделю вместе с категориями одним запросом, строками
+        rows = event_rows(
             Event.user_id == current_user.id,
             Event.start_time >= start_date,
             Event.start_time < end_date
         ).order_by(Event.start_time).all()
         
-        print(f"DEBUG: Найдено событий: {len(events)}")
-        
-        # Форматируем ответ
-        events_list = []
-        for event in events:
-            category = Category.query.get(event.category_id)
-            events_list.append({
-                'id': event.id,
-                'category_id': event.category_id,
-                'category_name': category.name if category else 'Без категории',
-                'category_color': category.color if category else '#4361ee',
-                'start_time': event.start_time.isoformat() + 'Z',
-                'end_time': event.end_time.isoformat() + 'Z',
-                'type': event.type,
-                'description': '',  # Можно добавить поле description в модель
-                'duration': int((event.end_time - event.start_time).total_seconds() / 60)
-            })
+        logger.debug('Неделя %s (%s - %s): событий %d', week_id, start_date, end_date, len(rows))
         
-        return jsonify({
+        payload = {
             'success': True,
             'week': {
                 'year': year,
@@ -582,16 +805,23 @@ def get_week_events_api(week_id):
                 'start_date': start_date.strftime('%Y-%m-%d'),
                 'end_date': (end_date - timedelta(seconds=1)).strftime('%Y-%m-%d')
             },
-            'events': events_list
-        })
+            'sync_cursor': sync_cursor
+        }
+        if columnar:
+            payload.update(events_columnar(rows, start_date))
+        else:
+            payload['events'] = [week_event_dict(row) for row in rows]
+        # Данные с реплики могут отставать: в кэш кладём только прочитанное из основной БД
+        if not replica_used():
+            week_cache.set(current_user.id, week_key, payload, variant, versions)
+        
+        return jsonify(payload)
         
     except ValueError as e:
-        print(f"DEBUG: Неверный формат недели: {week_id}, ошибка: {e}")
+        logger.debug('Неверный формат недели %s: %s', week_id, e)
         return jsonify({'error': f'Неверный формат недели. Используйте формат "YYYY-Www"'}), 400
     except Exception as e:
-        print(f"DEBUG: Ошибка в get_week_events_api: {str(e)}")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception('Ошибка в get_week_events_api')
         return jsonify({'error': f'Ошибка сервера: {str(e)}'}), 500
 
 
@@ -601,33 +831,10 @@ def get_week_events_api(week_id):
 @login_required
 def get_stats_api():
     """Получить статистику пользователя"""
-    # Общая статистика
-    categories_count = Category.query.filter_by(user_id=current_user.id).count()
-    total_events = Event.query.filter_by(user_id=current_user.id).count()
-    
-    # Статистика по типам
-    plan_events = Event.query.filter_by(user_id=current_user.id, type='plan').count()
-    fact_events = Event.query.filter_by(user_id=current_user.id, type='fact').count()
-    
-    # События за сегодня
-    today_start = datetime.now().date()
-    today_end = today_start + timedelta(days=1)
-    today_events = Event.query.filter(
-        Event.user_id == current_user.id,
-        Event.start_time >= today_start,
-        Event.start_time < today_end
-    ).count()
-    
+    # Один запрос по агрегатам вместо подсчёта по таблице events
     return jsonify({
         'success': True,
-        'stats': {
-            'categories': categories_count,
-            'total_events': total_events,
-            'plan_events': plan_events,
-            'fact_events': fact_events,
-            'today_events': today_events,
-            'productivity': round(fact_events / plan_events * 100, 1) if plan_events > 0 else 0
-        }
+        'stats': user_stats(current_user.id)
     })
 
 
@@ -635,6 +842,7 @@ def get_stats_api():
 
 @main_bp.route('/api/templates', methods=['GET'])
 @login_required
+@etag_versioned('templates')
 def get_templates_api():
     """Получить шаблоны пользователя"""
     templates = Template.query.filter_by(user_id=current_user.id).all()
@@ -643,7 +851,7 @@ def get_templates_api():
         'id': t.id,
         'name': t.name,
         'data': t.data,
-        'created_at': t.created_at.isoformat() + 'Z' if t.created_at else None
+        'created_at': iso_z(t.created_at)
     } for t in templates])
 
 
@@ -664,6 +872,7 @@ def create_template_api():
         )
         
         db.session.add(template)
+        bump_version(current_user.id, 'templates')
         db.session.commit()
         
         return jsonify({
@@ -676,6 +885,89 @@ def create_template_api():
         return jsonify({'error': f'Ошибка сервера: {str(e)}'}), 500
 
 
+@main_bp.route('/api/templates/<int:template_id>/apply', methods=['POST'])
+@login_required
+def apply_template_api(template_id):
+    """Применить шаблон к одной или нескольким неделям (dry_run - только показать изменения)"""
+    template = Template.query.filter_by(
+        id=template_id,
+        user_id=current_user.id
+    ).first()
+    
+    if not template:
+        return jsonify({'error': 'Шаблон не найден'}), 404
+    
+    data = request.get_json(silent=True) or {}
+    weeks = data.get('weeks') or ([data['week']] if data.get('week') else [])
+    dry_run = bool(data.get('dry_run', False))
+    on_conflict = data.get('on_conflict', 'skip')
+    
+    if not weeks or not isinstance(weeks, list):
+        return jsonify({'error': 'Укажите неделю (week) или список недель (weeks)'}), 400
+    if len(weeks) > MAX_TEMPLATE_WEEKS:
+        return jsonify({'error': f'Не более {MAX_TEMPLATE_WEEKS} недель за запрос'}), 400
+    if on_conflict not in CONFLICT_POLICIES:
+        return jsonify({'error': f'on_conflict: одно из {", ".join(CONFLICT_POLICIES)}'}), 400
+    
+    try:
+        rows, invalid_slots = expand_template(template.data, weeks)
+    except (ValueError, AttributeError):
+        return jsonify({'error': 'Неверный формат недели или шаблона. Используйте формат "YYYY-Www"'}), 400
+    
+    plan = plan_application(current_user.id, rows, on_conflict)
+    
+    def row_to_dict(row):
+        return {
+            'week': row['week'],
+            'slot': row['slot'],
+            'category_id': row['category_id'],
+            'start_time': iso_z(row['start_time']),
+            'end_time': iso_z(row['end_time']),
+            'type': row['type']
+        }
+    
+    diff = {
+        'create': [row_to_dict(row) for row in plan['create']],
+        'conflicts': [row_to_dict(row) for row in plan['conflicts']],
+        'replace': [{
+            'id': event.id,
+            'category_id': event.category_id,
+            'start_time': iso_z(event.start_time),
+            'end_time': iso_z(event.end_time),
+            'type': event.type
+        } for event in plan['replace']],
+        'invalid': invalid_slots + [row_to_dict(row) for row in plan['invalid']]
+    }
+    
+    if dry_run or not (plan['create'] or plan['replace']):
+        return jsonify({'success': True, 'dry_run': dry_run, **diff})
+    
+    try:
+        replaced_starts = [event.start_time for event in plan['replace']]
+        for event in plan['replace']:
+            db.session.delete(event)
+        ids = bulk_insert_events([{
+            'user_id': current_user.id,
+            'category_id': row['category_id'],
+            'start_time': row['start_time'],
+            'end_time': row['end_time'],
+            'type': row['type'],
+            'source': 'template'
+        } for row in plan['create']])
+        bump_version(current_user.id, 'events')
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Ошибка сервера: {str(e)}'}), 500
+    
+    week_cache.invalidate(current_user.id, *replaced_starts, *(row['start_time'] for row in plan['create']))
+    
+    for item, event_id in zip(diff['create'], ids):
+        item['id'] = event_id
+    
+    return jsonify({'success': True, 'dry_run': False, **diff}), 201
+
+
 # ==================== ТЕСТОВЫЙ МАРШРУТ ====================
 
 @main_bp.route('/api/health')
@@ -687,7 +979,63 @@ def health_check():
         'authenticated': current_user.is_authenticated
     })
 
+@main_bp.route('/debug/cache')
+@login_required
+def debug_cache():
+    """Счётчики попаданий/промахов кэшей процесса"""
+    return jsonify({
+        'week_cache': week_cache.stats(),
+        'session_users': session_users.stats(),
+        'telegram_identities': telegram_identities.stats(),
+        'category_matchers': category_matchers.stats(),
+        'live_updates': live_updates.stats()
+    })
+
+@main_bp.route('/debug/pool')
+@login_required
+def debug_pool():
+    """Заполненность пула соединений БД этого воркера и маршрутизация на реплику"""
+    stats = pool_stats()
+    stats['replica'] = replica_router.stats()
+    if replica_router.enabled:
+        stats['replica']['pool'] = db.engines[REPLICA_BIND].pool.status()
+    return jsonify(stats)
+
+@main_bp.route('/metrics')
+def metrics():
+    """Метрики воркера в формате Prometheus (Authorization: Bearer <METRICS_TOKEN>)"""
+    token = current_app.config.get('METRICS_TOKEN')
+    if token:
+        if request.headers.get('Authorization') != f'Bearer {token}':
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    elif not current_user.is_authenticated:
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    
+    pool = pool_metrics.stats()
+    live = live_updates.stats()
+    extra = [
+        ('tt_db_pool_checkouts_total', 'counter', 'Выдано соединений из пула', pool['checkouts']),
+        ('tt_db_pool_wait_seconds_total', 'counter', 'Суммарное ожидание соединения', pool['wait_total_ms'] / 1000),
+        ('tt_db_pool_timeouts_total', 'counter', 'Таймауты ожидания соединения', pool['timeouts']),
+        ('tt_db_pool_invalidations_total', 'counter', 'Разорванные соединения', pool['invalidations']),
+        ('tt_live_streams', 'gauge', 'Открытые SSE-потоки', live['streams']),
+    ]
+    return Response(request_metrics.prometheus(extra), mimetype='text/plain; version=0.0.4')
+
+@main_bp.route('/debug/profile')
+@login_required
+def debug_profile():
+    """Профиль endpoint по выборке запросов (PROFILE_SAMPLE_RATE); без ?endpoint= - список"""
+    endpoint = request.args.get('endpoint')
+    if not endpoint:
+        return jsonify({'sample_rate': request_metrics.profile_rate, 'samples': dict(request_metrics.profile_samples)})
+    report = request_metrics.profile_report(endpoint, sort=request.args.get('sort', 'cumulative'))
+    if report is None:
+        return jsonify({'error': 'Нет выборок для endpoint'}), 404
+    return Response(report, mimetype='text/plain')
+
 @main_bp.route('/debug/db')
+@use_primary
 @login_required
 def debug_database():
     """Полная диагностика базы данных"""
@@ -0,0 +1,74 @@
+import os
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+
+from app import db
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+
+def safe_database_url(url):
+    """Строка подключения без пароля - для вывода в консоль"""
+    return make_url(url).render_as_string(hide_password=True)
+
+
+def apply_migrations(engine):
+    """Применить ещё не применённые SQL-миграции, вернуть их имена (только PostgreSQL)"""
+    if engine.dialect.name != 'postgresql':
+        return None
+
+    with engine.begin() as conn:
+        conn.execute(text(
+            'CREATE TABLE IF NOT EXISTS schema_migrations ('
+            'name VARCHAR(255) PRIMARY KEY, applied_at TIMESTAMP NOT NULL DEFAULT now())'
+        ))
+        applied = {row[0] for row in conn.execute(text('SELECT name FROM schema_migrations'))}
+
+    names = []
+    for name in sorted(os.listdir(MIGRATIONS_DIR)):
+        if not name.endswith('.sql') or name in applied:
+            continue
+        with open(os.path.join(MIGRATIONS_DIR, name), encoding='utf-8') as f:
+            sql = f.read()
+        with engine.begin() as conn:
+            conn.exec_driver_sql(sql)
+            conn.execute(text('INSERT INTO schema_migrations (name) VALUES (:name)'), {'name': name})
+        names.append(name)
+    return names
+
+
+def _echo_migrations(names):
+    if names is None:
+        click.echo('Миграции рассчитаны на PostgreSQL, пропускаем')
+        return
+    for name in names:
+        click.echo(f'Применена миграция {name}')
+
+
+@click.command('apply-migrations')
+@with_appcontext
+def apply_migrations_command():
+    """Применить SQL-миграции из migrations/ (только PostgreSQL)"""
+    _echo_migrations(apply_migrations(db.engine))
+
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Создать недостающие таблицы и применить миграции (запускать при деплое, а не в воркерах)
+
+    Если агрегатов статистики ещё нет, а события есть (первый деплой с
+    daily_rollups/user_summaries), они заполняются так же, как backfill-rollups.
+    """
+    from app.rollups import backfill_rollups, rollups_missing
+
+    engine = db.engine
+    click.echo(f'База данных: {safe_database_url(engine.url)}')
+    db.create_all()
+    click.echo('Таблицы созданы')
+    _echo_migrations(apply_migrations(engine))
+    if rollups_missing():
+        click.echo(f'Агрегаты статистики заполнены: {backfill_rollups()} строк')
@@ -0,0 +1,154 @@
+from functools import lru_cache
+
+from flask import current_app
+from flask.json.provider import DefaultJSONProvider
+
+from app import db
+from app.models import Category, Event
+
+# Колонки события для запросов без ORM-объектов (db.session.query(*EVENT_COLUMNS))
+EVENT_COLUMNS = (
+    Event.id,
+    Event.category_id,
+    Event.start_time,
+    Event.end_time,
+    Event.type,
+    Event.source,
+    Event.created_at,
+    Category.name.label('category_name'),
+    Category.color.label('category_color'),
+)
+
+DEFAULT_COLOR = '#4361ee'
+EVENT_TYPES = ('plan', 'fact')
+
+
+def event_rows(*criteria):
+    """Запрос событий строками-кортежами вместе с категорией (без создания Event)"""
+    return db.session.query(*EVENT_COLUMNS).outerjoin(
+        Category, Category.id == Event.category_id
+    ).filter(*criteria)
+
+
+@lru_cache(maxsize=65536)
+def _iso_z(dt):
+    return dt.isoformat() + 'Z'
+
+
+def iso_z(dt):
+    """Время UTC в формате ISO с 'Z'; строки кэшируются - в неделе много одинаковых меток"""
+    return _iso_z(dt) if dt is not None else None
+
+
+def event_dict(event):
+    """Основные поля события; подходит и для Event, и для строки EVENT_COLUMNS"""
+    return {
+        'id': event.id,
+        'category_id': event.category_id,
+        'start_time': iso_z(event.start_time),
+        'end_time': iso_z(event.end_time),
+        'type': event.type,
+        'source': event.source,
+        'created_at': iso_z(event.created_at)
+    }
+
+
+def event_row_dict(row, no_category=''):
+    """Событие со сведениями о категории (строка EVENT_COLUMNS)"""
+    data = event_dict(row)
+    data['category_name'] = row.category_name if row.category_name is not None else no_category
+    data['category_color'] = row.category_color or DEFAULT_COLOR
+    return data
+
+
+def week_event_dict(row):
+    """Событие в формате недельной сетки schedule.html"""
+    data = event_row_dict(row, no_category='Без категории')
+    del data['source']
+    del data['created_at']
+    data['description'] = ''  # Можно добавить поле description в модель
+    data['duration'] = int((row.end_time - row.start_time).total_seconds() / 60)
+    return data
+
+
+def events_columnar(rows, origin):
+    """Компактный формат: параллельные массивы и один словарь категорий
+
+    start - минуты от origin (начала недели или диапазона), duration - минуты,
+    category - индекс в categories, type - индекс в types.
+    """
+    category_index = {}
+    categories = []
+    columns = {'id': [], 'start': [], 'duration': [], 'category': [], 'type': []}
+    type_index = {event_type: index for index, event_type in enumerate(EVENT_TYPES)}
+    types = list(EVENT_TYPES)
+
+    for row in rows:
+        index = category_index.get(row.category_id)
+        if index is None:
+            index = category_index[row.category_id] = len(categories)
+            categories.append({
+                'id': row.category_id,
+                'name': row.category_name if row.category_name is not None else 'Без категории',
+                'color': row.category_color or DEFAULT_COLOR
+            })
+        kind = type_index.get(row.type)
+        if kind is None:
+            kind = type_index[row.type] = len(types)
+            types.append(row.type)
+
+        start = int((row.start_time - origin).total_seconds() // 60)
+        columns['id'].append(row.id)
+        columns['start'].append(start)
+        columns['duration'].append(int((row.end_time - origin).total_seconds() // 60) - start)
+        columns['category'].append(index)
+        columns['type'].append(kind)
+
+    return {
+        'format': 'columnar',
+        'origin': iso_z(origin),
+        'types': types,
+        'categories': categories,
+        'events': columns
+    }
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """jsonify через orjson (pip install orjson); поведение как у стандартного провайдера"""
+
+    def __init__(self, app):
+        super().__init__(app)
+        import orjson
+        self._orjson = orjson
+        # Даты отдаём в default - формат тот же, что у стандартного провайдера
+        self._options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            self._options |= orjson.OPT_SORT_KEYS
+
+    def dumps(self, obj, **kwargs):
+        return self._orjson.dumps(obj, default=self.default, option=self._options).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return self._orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        data = self._orjson.dumps(obj, default=self.default, option=self._options | self._orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(data, mimetype=self.mimetype)
+
+
+def init_json(app):
+    """Выбрать JSON-бэкенд по JSON_BACKEND: 'orjson', 'stdlib' или 'auto' (orjson, если установлен)"""
+    backend = app.config.get('JSON_BACKEND', 'auto')
+    if backend == 'stdlib':
+        return
+    try:
+        app.json = OrjsonProvider(app)
+    except ImportError:
+        if backend == 'orjson':
+            raise RuntimeError('Для JSON_BACKEND=orjson нужен пакет orjson: pip install orjson')
+
+
+def dumps_line(obj):
+    """Одна строка NDJSON текущим JSON-бэкендом приложения"""
+    return current_app.json.dumps(obj) + '\n'
@@ -0,0 +1,137 @@
+import base64
+from datetime import datetime, timedelta, timezone
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models import Category, CategoryAlias, Event, Template, Tombstone
+from app.serializers import event_row_dict, event_rows, iso_z
+
+SYNC_KINDS = ('events', 'categories', 'templates')
+_ENTITY_KINDS = {Event: 'events', Category: 'categories', Template: 'templates'}
+
+# Окно перекрытия: изменения из транзакций, закоммиченных чуть позже чтения,
+# и небольшой разброс часов между воркерами. Повтор строки клиенту не вредит.
+SYNC_OVERLAP = timedelta(seconds=10)
+
+
+def tombstone_retention():
+    """Сколько хранятся записи об удалениях (SYNC_TOMBSTONE_RETENTION_DAYS)"""
+    return timedelta(days=current_app.config.get('SYNC_TOMBSTONE_RETENTION_DAYS', 30))
+
+
+def encode_sync_cursor(moment):
+    return base64.urlsafe_b64encode(moment.isoformat().encode('ascii')).decode('ascii')
+
+
+def decode_sync_cursor(cursor):
+    """Курсор из encode_sync_cursor -> naive datetime в UTC; ValueError, если он испорчен"""
+    moment = datetime.fromisoformat(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('ascii'))
+    if moment.tzinfo is not None:
+        # Курсор собран клиентом со смещением - сравниваем с naive utcnow()
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+@event.listens_for(Session, 'before_flush')
+def _record_tombstones(session, flush_context, instances):
+    """Удаление события, категории или шаблона оставляет запись для синхронизации"""
+    now = datetime.utcnow()
+    for obj in list(session.deleted):
+        kind = _ENTITY_KINDS.get(type(obj))
+        if kind is not None:
+            session.add(Tombstone(user_id=obj.user_id, entity=kind, entity_id=obj.id, deleted_at=now))
+
+
+def _category_dicts(user_id, categories):
+    aliases = {}
+    if categories:
+        for category_id, alias in db.session.query(CategoryAlias.category_id, CategoryAlias.alias).filter(
+                CategoryAlias.user_id == user_id,
+                CategoryAlias.category_id.in_([category.id for category in categories])):
+            aliases.setdefault(category_id, []).append(alias)
+    return [{
+        'id': category.id,
+        'name': category.name,
+        'color': category.color,
+        'aliases': sorted(aliases.get(category.id, []))
+    } for category in categories]
+
+
+def sync_changes(user_id, since=None, kinds=SYNC_KINDS):
+    """Изменения пользователя после курсора since (datetime) по видам kinds
+
+    Без since или с курсором старше tombstone_retention() отдаёт полное
+    состояние с reset=True - клиент должен заменить свои данные целиком.
+    """
+    now = datetime.utcnow()
+    reset = since is None or since < now - tombstone_retention()
+    after = None if reset else since - SYNC_OVERLAP
+    payload = {'cursor': encode_sync_cursor(now), 'reset': reset}
+
+    if 'events' in kinds:
+        query = event_rows(Event.user_id == user_id)
+        if after is not None:
+            query = query.filter(Event.updated_at > after)
+        payload['events'] = [event_row_dict(row) for row in query.order_by(Event.updated_at, Event.id)]
+
+    if 'categories' in kinds:
+        query = Category.query.filter(Category.user_id == user_id)
+        if after is not None:
+            query = query.filter(Category.updated_at > after)
+        payload['categories'] = _category_dicts(user_id, query.order_by(Category.id).all())
+
+    if 'templates' in kinds:
+        query = Template.query.filter(Template.user_id == user_id)
+        if after is not None:
+            query = query.filter(Template.updated_at > after)
+        payload['templates'] = [{
+            'id': template.id,
+            'name': template.name,
+            'data': template.data,
+            'created_at': iso_z(template.created_at)
+        } for template in query.order_by(Template.id)]
+
+    deleted = {kind: [] for kind in kinds}
+    if after is not None:
+        for kind, entity_id in db.session.query(Tombstone.entity, Tombstone.entity_id).filter(
+                Tombstone.user_id == user_id,
+                Tombstone.deleted_at > after,
+                Tombstone.entity.in_(kinds)).order_by(Tombstone.id):
+            deleted[kind].append(entity_id)
+    payload['deleted'] = deleted
+    return payload
+
+
+def parse_sync_request(args):
+    """(since, kinds) из параметров ?since=<cursor>&types=events,categories"""
+    cursor = args.get('since')
+    since = decode_sync_cursor(cursor) if cursor else None
+    types = args.get('types')
+    kinds = tuple(kind for kind in SYNC_KINDS if kind in types.split(',')) if types else SYNC_KINDS
+    if not kinds:
+        raise ValueError('types')
+    return since, kinds
+
+
+@click.command('purge-tombstones')
+@click.option('--days', type=int, default=None,
+              help='Сколько дней хранить записи (не меньше SYNC_TOMBSTONE_RETENTION_DAYS)')
+@with_appcontext
+def purge_tombstones_command(days):
+    """Удалить старые записи об удалениях"""
+    retention = tombstone_retention().days
+    if days is None:
+        days = retention
+    elif days < retention:
+        # Иначе курсор младше срока хранения молча потеряет удаления
+        raise click.BadParameter(f'не меньше SYNC_TOMBSTONE_RETENTION_DAYS ({retention})', param_hint='--days')
+    deleted = Tombstone.query.filter(
+        Tombstone.deleted_at < datetime.utcnow() - timedelta(days=days)
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    click.echo(f'Удалено записей: {deleted}')
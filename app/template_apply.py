@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import Category
+from app.overlap import OverlapChecker
+from app.serializers import EVENT_TYPES
+
+CONFLICT_POLICIES = ('skip', 'replace')
+
+
+def parse_week_id(week_id):
+    """'YYYY-Www' -> понедельник 00:00 этой ISO-недели"""
+    year_str, week_str = week_id.split('-W')
+    return datetime.fromisocalendar(int(year_str), int(week_str), 1)
+
+
+def _slot_minutes(value):
+    hours, minutes = map(int, value.split(':'))
+    return hours * 60 + minutes
+
+
+def template_slots(data):
+    """Слоты шаблона из Template.data
+
+    Формат: {"events": [{"day": 0..6 (0 - понедельник), "start": "HH:MM",
+    "end": "HH:MM" или "duration": минуты, "category_id": id, "type": "plan"}]}
+    или сразу список таких слотов.
+    """
+    slots = data.get('events', []) if isinstance(data, dict) else data
+    if not isinstance(slots, list):
+        raise ValueError('Шаблон не содержит списка событий')
+    return slots
+
+
+def expand_template(data, week_ids):
+    """Развернуть шаблон в конкретные события для списка недель
+
+    Возвращает (rows, invalid): rows - словари с полями Event без user_id,
+    invalid - слоты, которые не удалось разобрать (в том числе с type не из EVENT_TYPES).
+    """
+    rows = []
+    invalid = []
+    slots = template_slots(data)
+    for week_id in week_ids:
+        week_start = parse_week_id(week_id)
+        for index, slot in enumerate(slots):
+            try:
+                day = int(slot['day'])
+                if not 0 <= day <= 6:
+                    raise ValueError('day')
+                start_minutes = _slot_minutes(slot['start'])
+                if 'end' in slot:
+                    end_minutes = _slot_minutes(slot['end'])
+                else:
+                    end_minutes = start_minutes + int(slot['duration'])
+                if end_minutes <= start_minutes:
+                    raise ValueError('end')
+                event_type = slot.get('type', 'plan')
+                if not isinstance(event_type, str) or event_type not in EVENT_TYPES:
+                    raise ValueError('type')
+                day_start = week_start + timedelta(days=day)
+                rows.append({
+                    'week': week_id,
+                    'slot': index,
+                    'category_id': int(slot['category_id']),
+                    'start_time': day_start + timedelta(minutes=start_minutes),
+                    'end_time': day_start + timedelta(minutes=end_minutes),
+                    'type': event_type
+                })
+            except (KeyError, TypeError, ValueError, AttributeError):
+                invalid.append({'week': week_id, 'slot': index})
+    return rows, invalid
+
+
+def plan_application(user_id, rows, on_conflict='skip'):
+    """Сравнить развёрнутые события с уже существующими
+
+    Делает один запрос категорий и один интервальный запрос событий.
+    Возвращает словарь: create (строки к вставке), conflicts (пропущенные
+    строки), replace (существующие Event, которые будут удалены), invalid.
+    """
+    category_ids = {row['category_id'] for row in rows}
+    owned_categories = {
+        category_id for (category_id,) in db.session.query(Category.id).filter(
+            Category.user_id == user_id,
+            Category.id.in_(category_ids)
+        )
+    } if category_ids else set()
+
+    invalid = [row for row in rows if row['category_id'] not in owned_categories]
+    rows = [row for row in rows if row['category_id'] in owned_categories]
+
+    existing = OverlapChecker.load(user_id, rows, entities=True)
+    planned = OverlapChecker()
+
+    create = []
+    conflicts = []
+    replaced = {}
+    for row in rows:
+        span = (row['type'], row['start_time'], row['end_time'])
+        if planned.find(*span) or (on_conflict == 'skip' and existing.find(*span)):
+            conflicts.append(row)
+            continue
+        if on_conflict == 'replace':
+            for _, _, event in existing.find_all(*span):
+                replaced[event.id] = event
+        planned.add(*span)
+        create.append(row)
+
+    return {
+        'create': create,
+        'conflicts': conflicts,
+        'replace': list(replaced.values()),
+        'invalid': invalid
+    }
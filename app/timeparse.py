@@ -0,0 +1,192 @@
+import re
+from functools import lru_cache
+from datetime import datetime, timedelta, timezone
+
+# Общий разбор времени для веб-API и бота.
+# В БД время хранится без зоны (UTC), поэтому все функции возвращают naive UTC.
+
+_DATETIME_RE = re.compile(
+    r'(\d{4})-(\d{2})-(\d{2})(?:[T ](\d{2}):(\d{2})(?::(\d{2})(?:[.,](\d{1,6})\d*)?)?'
+    r'\s*(Z|[+-]\d{2}:?\d{2})?)?',
+    re.IGNORECASE
+)
+_CLOCK_RE = re.compile(r'(\d{1,2})(?:[:.](\d{2}))?\s*([ap]\.?m\.?)?', re.IGNORECASE)
+_RANGE_RE = re.compile(
+    r'(?:с\s+|from\s+)?(\d{1,2}[:.]\d{2}(?:\s*[ap]\.?m\.?)?)\s*(?:-|–|—|до|to)\s*'
+    r'(\d{1,2}[:.]\d{2}(?:\s*[ap]\.?m\.?)?)',
+    re.IGNORECASE
+)
+_DURATION_PART_RE = re.compile(r'(\d+(?:[.,]\d+)?|полтора|полторы|пол)\s*([a-zа-яё]*)\.?\s*', re.IGNORECASE)
+_DURATION_JOINER_RE = re.compile(r'(?:и|and|,)\s+', re.IGNORECASE)
+_CLOCK_DURATION_RE = re.compile(r'(\d{1,2}):(\d{2})')
+
+_WORD_NUMBERS = {'полтора': 1.5, 'полторы': 1.5, 'пол': 0.5}
+_UNITS = {}
+for _unit in ('h', 'hr', 'hrs', 'hour', 'hours', 'ч', 'час', 'часа', 'часов', 'часик', 'часика'):
+    _UNITS[_unit] = 60
+for _unit in ('m', 'min', 'mins', 'minute', 'minutes', 'м', 'мин', 'минута', 'минуты', 'минут', 'минуту'):
+    _UNITS[_unit] = 1
+
+MAX_DURATION_MINUTES = 7 * 24 * 60
+
+
+# Сдвиг до UTC для смещений '+HH:MM'/'-HH:MM': быстрый путь обходится без tzinfo
+_OFFSET_SHIFTS = {
+    f'{sign}{hours:02d}:{minutes:02d}': timedelta(0, (-1 if sign == '+' else 1) * (hours * 60 + minutes) * 60)
+    for sign in '+-' for hours in range(24) for minutes in range(60)
+}
+_fromisoformat = datetime.fromisoformat
+
+
+def _to_utc(parsed):
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def parse_datetime(value):
+    """Дата и время от клиента -> naive UTC
+
+    Быстрый путь для канонических 'YYYY-MM-DD HH:MM:SS', ISO с 'Z' и
+    со смещением '±HH:MM' (в том числе с долями секунды): зона срезается
+    по фиксированной позиции, сдвиг берётся из готовой таблицы. Остальные
+    варианты (без секунд, только дата, пробел перед зоной) разбираются
+    заранее скомпилированным шаблоном.
+    """
+    if not isinstance(value, str):
+        raise ValueError(f'Неверный формат времени: {value!r}')
+
+    length = len(value)
+    if length > 20:
+        # Зона срезается по фиксированной позиции; tzinfo у остатка - вторая зона в строке
+        if value[-1] == 'Z':
+            try:
+                parsed = _fromisoformat(value[:-1])
+            except ValueError:
+                pass
+            else:
+                if parsed.tzinfo is None:
+                    return parsed
+        else:
+            shift = _OFFSET_SHIFTS.get(value[-6:])
+            if shift is not None:
+                try:
+                    parsed = _fromisoformat(value[:-6])
+                except ValueError:
+                    pass
+                else:
+                    if parsed.tzinfo is None:
+                        return parsed + shift
+    elif (length == 19 or (length == 20 and value[19] in 'Zz')) and value[10] in ' T':
+        return _fromisoformat(value[:19])
+
+    # Прочие формы - сначала встроенный C-разбор, затем шаблон
+    # (наносекунды, 'Z' на старых версиях Python, пробел перед зоной)
+    try:
+        return _to_utc(datetime.fromisoformat(value))
+    except ValueError:
+        pass
+
+    match = _DATETIME_RE.fullmatch(value.strip())
+    if not match:
+        raise ValueError(f'Неверный формат времени: {value!r}')
+    year, month, day, hour, minute, second, fraction, zone = match.groups()
+    parsed = datetime(
+        int(year), int(month), int(day), int(hour or 0), int(minute or 0),
+        int(second or 0), int((fraction or '0').ljust(6, '0'))
+    )
+    if zone and zone.upper() != 'Z':
+        sign = -1 if zone[0] == '-' else 1
+        digits = zone[1:].replace(':', '')
+        offset = timedelta(hours=int(digits[:2]), minutes=int(digits[2:]))
+        parsed = _to_utc(parsed.replace(tzinfo=timezone(sign * offset)))
+    return parsed
+
+
+def parse_clock(value, base=None):
+    """Время суток '14:30', '9.05', '2:30 PM' -> datetime в день base (по умолчанию сегодня, UTC)"""
+    match = _CLOCK_RE.fullmatch(value.strip())
+    if not match:
+        raise ValueError(f"Can't parse time: {value}")
+    hours, minutes, meridiem = int(match.group(1)), int(match.group(2) or 0), match.group(3)
+    if meridiem:
+        if not 1 <= hours <= 12:
+            raise ValueError(f"Can't parse time: {value}")
+        hours = hours % 12 + (12 if meridiem[0] in 'pP' else 0)
+    elif match.group(2) is None:
+        raise ValueError(f"Can't parse time: {value}")
+    if hours > 23 or minutes > 59:
+        raise ValueError(f"Can't parse time: {value}")
+    base = base or datetime.utcnow()
+    return base.replace(hour=hours, minute=minutes, second=0, microsecond=0)
+
+
+def parse_duration(value):
+    """Длительность: '90', '2 часа', '90 минут', '1h30m', '1ч 30м', '1,5 ч', 'полтора часа', '1:30'
+
+    Число без единиц - минуты, словесное ('полтора') - часы.
+    """
+    text = str(value).strip().lower().replace('ё', 'е')
+    if text.isdigit():
+        return _checked_duration(int(text), value)
+    return _checked_duration(_duration_minutes(text), value)
+
+
+@lru_cache(maxsize=1024)
+def _duration_minutes(text):
+    """Разбор нормализованной строки в минуты (ввод из бота часто повторяется)"""
+    if not text:
+        raise ValueError("Can't parse duration: empty")
+
+    match = _CLOCK_DURATION_RE.fullmatch(text)
+    if match:
+        return int(match.group(1)) * 60 + int(match.group(2))
+
+    minutes = 0.0
+    position = 0
+    while position < len(text):
+        if minutes:
+            joiner = _DURATION_JOINER_RE.match(text, position)
+            if joiner:
+                position = joiner.end()
+        match = _DURATION_PART_RE.match(text, position)
+        if not match or match.end() == position:
+            raise ValueError(f"Can't parse duration: {text}")
+        number, unit = match.groups()
+        if number in _WORD_NUMBERS:
+            amount = _WORD_NUMBERS[number]
+            scale = _UNITS.get(unit, 60 if not unit else None)
+        else:
+            amount = float(number.replace(',', '.'))
+            scale = _UNITS.get(unit, 1 if not unit else None)
+        if scale is None:
+            raise ValueError(f"Can't parse duration: {text}")
+        minutes += amount * scale
+        position = match.end()
+    return minutes
+
+
+def _checked_duration(minutes, value):
+    if not 0 < minutes <= MAX_DURATION_MINUTES:
+        raise ValueError(f'Duration out of range: {value}')
+    return timedelta(minutes=minutes)
+
+
+def parse_range(value, base=None):
+    """Интервал '14:30-16:00', 'с 9:00 до 10:30' -> (start, end); через полночь - на следующий день"""
+    match = _RANGE_RE.fullmatch(value.strip())
+    if not match:
+        raise ValueError(f"Can't parse range: {value}")
+    start = parse_clock(match.group(1), base)
+    end = parse_clock(match.group(2), start)
+    if end <= start:
+        end += timedelta(days=1)
+    return start, end
+
+
+def parse_time_input(value, now=None):
+    """Ввод из бота: интервал ('14:30-16:00') или длительность от текущего момента ('1h30m')"""
+    now = now or datetime.utcnow()
+    if _RANGE_RE.fullmatch(value.strip()):
+        return parse_range(value, now)
+    return now, now + parse_duration(value)
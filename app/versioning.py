@@ -0,0 +1,72 @@
+import hashlib
+from functools import wraps
+
+from flask import g, request, make_response
+from flask_login import current_user
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import DataVersion
+
+VERSION_KINDS = ('events', 'categories', 'templates')
+
+
+def bump_version(user_id, *kinds):
+    """Увеличить счётчики изменений в текущей транзакции (до commit)"""
+    values = {getattr(DataVersion, kind): getattr(DataVersion, kind) + 1 for kind in kinds}
+    updated = DataVersion.query.filter_by(user_id=user_id).update(values, synchronize_session=False)
+    if updated:
+        return
+
+    # Первой записи ещё нет - создаём её
+    try:
+        with db.session.begin_nested():
+            db.session.add(DataVersion(user_id=user_id, **{kind: 1 for kind in kinds}))
+    except IntegrityError:
+        # Параллельный запрос успел создать строку
+        DataVersion.query.filter_by(user_id=user_id).update(values, synchronize_session=False)
+
+
+def get_versions(user_id, *kinds):
+    """Текущие счётчики пользователя одним запросом по первичному ключу"""
+    columns = [getattr(DataVersion, kind) for kind in kinds]
+    row = db.session.query(*columns).filter(DataVersion.user_id == user_id).first()
+    return tuple(row) if row else (0,) * len(kinds)
+
+
+def make_etag(user_id, kinds, versions):
+    """Сильный ETag: пользователь + версии + путь с параметрами запроса"""
+    parts = [str(user_id), request.full_path]
+    parts += [f'{kind}={version}' for kind, version in zip(kinds, versions)]
+    return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+
+
+def _request_user_id():
+    """Пользователь запроса: из telegram_auth_required или из сессии"""
+    telegram_user = getattr(request, 'current_user', None)
+    return telegram_user.id if telegram_user is not None else current_user.id
+
+
+def etag_versioned(*kinds):
+    """Декоратор для GET-списков: отвечает 304, если данные не менялись"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            user_id = _request_user_id()
+            versions = get_versions(user_id, *kinds)
+            etag = make_etag(user_id, kinds, versions)
+            # Те же версии - ключ согласованности для кэшей ответа (week_cache)
+            g.etag_versions = versions
+
+            if request.if_none_match.contains(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return decorated_function
+    return decorator
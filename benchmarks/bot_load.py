@@ -0,0 +1,201 @@
+"""Нагрузочный замер обработчиков бота против локальной заглушки /api/v1/telegram/*
+
+Через заглушку гоняются настоящие корутины bot.py: stats_command
+(ApiClient), add_event и quick_event (кэш категорий, /telegram/sync) и
+фоновая отправка очереди быстрых событий (/telegram/quick/batch). Для
+сравнения - старая схема статистики с блокирующим запросом внутри
+async-обработчика. Нужны зависимости бота (python-telegram-bot, httpx). Запуск:
+
+    python benchmarks/bot_load.py --updates 300 --users 50 --latency 0.05
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bot'))
+
+CATEGORIES = [{'id': 1, 'name': 'Работа', 'color': '#3498db', 'aliases': ['раб']},
+              {'id': 2, 'name': 'Спорт', 'color': '#2ecc71', 'aliases': []}]
+
+
+def make_stub(latency):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+        requests = {}
+        lock = threading.Lock()
+
+        def _reply(self, status, payload):
+            time.sleep(latency)  # Имитация работы сервера и БД
+            with self.lock:
+                route = self.path.split('?')[0]
+                self.requests[route] = self.requests.get(route, 0) + 1
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.startswith('/api/v1/telegram/sync'):
+                self._reply(200, {'cursor': 'bench', 'reset': True, 'categories': CATEGORIES,
+                                  'deleted': {'categories': []}})
+            elif self.path.startswith('/api/v1/telegram/stats'):
+                self._reply(200, {'today': 1, 'total': 10, 'plan': 5, 'fact': 5})
+            else:
+                self._reply(404, {'error': 'not found'})
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            data = json.loads(self.rfile.read(length) or b'{}')
+            if self.path.startswith('/api/v1/telegram/quick/batch'):
+                self._reply(200, {'results': [{'key': item['key'], 'status': 'created'}
+                                              for item in data.get('events', [])]})
+            else:
+                self._reply(404, {'error': 'not found'})
+
+        def log_message(self, *args):
+            pass
+
+    return StubHandler
+
+
+class FakeMessage:
+    """Сообщение Telegram в объёме, который читают обработчики bot.py"""
+
+    def __init__(self, text):
+        self.text = text
+        self.date = datetime.now(timezone.utc)
+        self.replies = []
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+
+class FakeCallbackQuery:
+    def __init__(self, user, data):
+        self.from_user = user
+        self.data = data
+        self.replies = []
+
+    async def answer(self, *args, **kwargs):
+        pass
+
+    async def edit_message_text(self, text, **kwargs):
+        self.replies.append(text)
+
+
+def fake_update(user_id, text=None, callback_data=None):
+    user = SimpleNamespace(id=user_id, first_name=f'user{user_id}', username=None)
+    return SimpleNamespace(
+        effective_user=user,
+        effective_chat=SimpleNamespace(id=user_id),
+        message=FakeMessage(text) if text is not None else None,
+        callback_query=FakeCallbackQuery(user, callback_data) if callback_data is not None else None
+    )
+
+
+def replies(update):
+    return (update.message or update.callback_query).replies
+
+
+async def run_blocking_stats(base_url, count, users):
+    """Старое поведение: блокирующий вызов прямо в корутине"""
+    async def handler(update):
+        request = urllib.request.Request(f'{base_url}/telegram/stats',
+                                         headers={'X-Telegram-ID': str(update.effective_user.id)})
+        with urllib.request.urlopen(request) as response:
+            json.loads(response.read())
+        await update.message.reply_text('stats')
+
+    updates = [fake_update(i % users, text='/stats') for i in range(count)]
+    await asyncio.gather(*(handler(update) for update in updates))
+    return updates
+
+
+async def run_handlers(bot, name, count, users):
+    """count обновлений одного вида через обработчик bot.py, одновременно, как при concurrent_updates"""
+    if name == 'stats_command':
+        updates = [fake_update(i % users, text='/stats') for i in range(count)]
+        handler = bot.stats_command
+    elif name == 'add_event':
+        updates = [fake_update(i % users, callback_data='add_event') for i in range(count)]
+        handler = bot.add_event
+    else:
+        updates = [fake_update(i % users, text='раб') for i in range(count)]
+        handler = bot.quick_event
+    try:
+        await asyncio.gather(*(handler(update, None) for update in updates))
+    finally:
+        await bot.api.close()
+    return updates
+
+
+async def run_flush(bot):
+    try:
+        return await bot.quick_queue.flush()
+    finally:
+        await bot.api.close()
+
+
+def report(name, count, elapsed, failed=0):
+    line = f'{name:>22}: {count} за {elapsed:.2f} с ({count / elapsed:.0f} в секунду)'
+    print(line + (f', ошибок: {failed}' if failed else ''))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--updates', type=int, default=300, help='Обновлений каждого вида')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--concurrency', type=int, default=20)
+    args = parser.parse_args()
+
+    stub = make_stub(args.latency)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), stub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_address[1]}/api/v1'
+
+    workdir = tempfile.mkdtemp(prefix='bot-load-')
+    # bot.py читает настройки при импорте
+    os.environ['API_URL'] = base_url
+    os.environ['API_CONCURRENCY'] = str(args.concurrency)
+    os.environ['QUICK_QUEUE_PATH'] = os.path.join(workdir, 'quick_queue.sqlite3')
+    import bot  # noqa: E402
+
+    try:
+        started = time.perf_counter()
+        updates = asyncio.run(run_blocking_stats(base_url, args.updates, args.users))
+        report('blocking stats', len(updates), time.perf_counter() - started)
+
+        # add_event до quick_event: первый проход по пользователю заполняет кэш категорий
+        for name in ('stats_command', 'add_event', 'quick_event'):
+            started = time.perf_counter()
+            updates = asyncio.run(run_handlers(bot, name, args.updates, args.users))
+            elapsed = time.perf_counter() - started
+            expected = {'stats_command': '📊', 'add_event': 'Выберите', 'quick_event': '✅'}[name]
+            failed = sum(1 for update in updates if not replies(update) or not replies(update)[0].startswith(expected))
+            report(name, len(updates), elapsed, failed)
+
+        pending = bot.quick_queue.pending()
+        started = time.perf_counter()
+        delivered = asyncio.run(run_flush(bot))
+        report('quick_queue.flush', delivered, time.perf_counter() - started, pending - delivered)
+        print('Запросов к заглушке:', dict(sorted(stub.requests.items())))
+    finally:
+        bot.quick_queue.close()
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""Замер холодного старта: импорт пакета app и create_app() в чистом интерпретаторе
+
+Каждый прогон - отдельный процесс python с SQLite в памяти, поэтому
+кэши модулей не мешают. Запуск:
+
+    python benchmarks/startup.py --repeat 5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Код одного прогона: печатает JSON с временами в миллисекундах
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, {root!r})
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+app.test_client().get('/login')
+served = time.perf_counter()
+print(json.dumps({{
+    'import': (imported - started) * 1000,
+    'create_app': (created - imported) * 1000,
+    'first_request': (served - created) * 1000,
+    'modules': len(sys.modules)
+}}))
+'''
+
+
+def run_once():
+    env = dict(os.environ, DATABASE_URL='sqlite://', SECRET_KEY='benchmark')
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE.format(root=ROOT)],
+        env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.repeat)]
+    for name in ('import', 'create_app', 'first_request'):
+        values = sorted(run[name] for run in runs)
+        print(f'{name:>14}: мин {values[0]:7.1f} мс, медиана {values[len(values) // 2]:7.1f} мс')
+    print(f'{"модулей":>14}: {runs[-1]["modules"]}')
+
+
+if __name__ == '__main__':
+    main()
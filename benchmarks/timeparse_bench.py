@@ -0,0 +1,160 @@
+"""Микро-замер разбора времени (app/timeparse.py) против прежних веток в маршрутах
+
+Перед замером прогоняет корпус timeparse_corpus.json, а с --fuzz ещё и
+случайные мутации корпуса: парсер должен либо вернуть значение, либо
+бросить ValueError. Запуск:
+
+    python benchmarks/timeparse_bench.py --number 100000 --fuzz 20000
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import timeit
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.timeparse import parse_datetime, parse_duration, parse_time_input  # noqa: E402
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'timeparse_corpus.json')
+
+
+def old_parse_datetime(value):
+    """Прежняя ветка из create_event_api / _parse_client_time"""
+    if ' ' in value and 'T' not in value:
+        return datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+    return datetime.fromisoformat(value.replace('Z', '+00:00').replace(' ', 'T'))
+
+
+def old_parse_datetime_utc(value):
+    """Прежняя ветка плюс перевод в naive UTC: без него время со смещением не сравнить с колонками БД"""
+    parsed = old_parse_datetime(value)
+    return parsed.astimezone(timezone.utc).replace(tzinfo=None) if parsed.tzinfo is not None else parsed
+
+
+def old_parse_duration(duration_str):
+    """Прежний parse_duration из api_routes.py"""
+    duration_str = duration_str.lower()
+    if 'час' in duration_str or 'hour' in duration_str:
+        return timedelta(hours=float(re.search(r'[\d.]+', duration_str).group()))
+    return timedelta(minutes=float(re.search(r'[\d.]+', duration_str).group()))
+
+
+def check_corpus(corpus):
+    failures = []
+    for value, expected in corpus['datetime'].items():
+        try:
+            result = parse_datetime(value).isoformat()
+        except ValueError as e:
+            result = f'ValueError: {e}'
+        if result != expected:
+            failures.append(('datetime', value, expected, result))
+    for value, expected in corpus['duration'].items():
+        try:
+            result = parse_duration(value).total_seconds() / 60
+        except ValueError as e:
+            result = f'ValueError: {e}'
+        if result != expected:
+            failures.append(('duration', value, expected, result))
+
+    now = datetime(2025, 3, 3, 12, 0)
+    for value, (start, end, days) in corpus['time_input'].items():
+        try:
+            start_time, end_time = parse_time_input(value, now)
+            result = [start_time.strftime('%H:%M'), end_time.strftime('%H:%M'), (end_time.date() - now.date()).days]
+        except ValueError as e:
+            result = f'ValueError: {e}'
+        if result != [start, end, days]:
+            failures.append(('time_input', value, [start, end, days], result))
+
+    for kind, parse in (('datetime_invalid', parse_datetime), ('duration_invalid', parse_duration),
+                        ('time_input_invalid', lambda value: parse_time_input(value, now))):
+        for value in corpus[kind]:
+            try:
+                result = parse(value)
+            except ValueError:
+                continue
+            failures.append((kind, value, 'ValueError', result))
+    return failures
+
+
+def mutate(value, rng):
+    alphabet = '0123456789:-.,TZ+ hmчасминпол'
+    chars = list(value)
+    for _ in range(rng.randint(1, 3)):
+        operation = rng.randrange(3)
+        position = rng.randrange(len(chars) + 1)
+        if operation == 0 or not chars:
+            chars.insert(position, rng.choice(alphabet))
+        elif operation == 1:
+            del chars[min(position, len(chars) - 1)]
+        else:
+            chars[min(position, len(chars) - 1)] = rng.choice(alphabet)
+    return ''.join(chars)
+
+
+def fuzz(corpus, iterations, seed):
+    """Случайные мутации корпуса: допустим только ValueError"""
+    rng = random.Random(seed)
+    seeds = list(corpus['datetime']) + list(corpus['duration']) + list(corpus['time_input'])
+    crashes = []
+    for _ in range(iterations):
+        value = mutate(rng.choice(seeds), rng)
+        for parse in (parse_datetime, parse_duration, parse_time_input):
+            try:
+                parse(value)
+            except ValueError:
+                pass
+            except Exception as e:  # noqa: BLE001 - ищем именно неожиданные исключения
+                crashes.append((parse.__name__, value, repr(e)))
+    return crashes
+
+
+def bench(number):
+    cases = (
+        ('datetime "YYYY-MM-DD HH:MM:SS"', '2025-03-03 10:00:00', old_parse_datetime, parse_datetime),
+        ('datetime ISO-Z', '2025-03-03T10:00:00Z', old_parse_datetime, parse_datetime),
+        ('datetime ISO ms+offset', '2025-03-03T13:00:00.123+03:00', old_parse_datetime, parse_datetime),
+        ('datetime ISO offset', '2025-03-03T13:00:00-05:00', old_parse_datetime, parse_datetime),
+        ('datetime ISO ms+offset -> UTC', '2025-03-03T13:00:00.123+03:00', old_parse_datetime_utc, parse_datetime),
+        ('datetime ISO ms-Z', '2025-03-03T10:00:00.250Z', old_parse_datetime, parse_datetime),
+        ('duration "90 минут"', '90 минут', old_parse_duration, parse_duration),
+        ('duration "2 часа"', '2 часа', old_parse_duration, parse_duration),
+    )
+    for name, value, old, new in cases:
+        # Минимум из нескольких прогонов: меньше шума от соседних процессов
+        old_time = min(timeit.repeat(lambda: old(value), number=number, repeat=5))
+        new_time = min(timeit.repeat(lambda: new(value), number=number, repeat=5))
+        print(f'{name:>32}: было {old_time / number * 1e6:.2f} мкс, '
+              f'стало {new_time / number * 1e6:.2f} мкс (x{old_time / new_time:.1f})')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=100000)
+    parser.add_argument('--fuzz', type=int, default=0, help='число случайных мутаций корпуса')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with open(CORPUS_PATH, encoding='utf-8') as f:
+        corpus = json.load(f)
+
+    failures = check_corpus(corpus)
+    for failure in failures:
+        print('Корпус: %s %r: ожидалось %r, получено %r' % failure)
+    crashes = fuzz(corpus, args.fuzz, args.seed) if args.fuzz else []
+    for crash in crashes[:20]:
+        print('Fuzz: %s(%r) -> %s' % crash)
+    if failures or crashes:
+        sys.exit(1)
+    print(f'Корпус в порядке, fuzz: {args.fuzz} мутаций без неожиданных исключений')
+
+    bench(args.number)
+
+
+if __name__ == '__main__':
+    main()
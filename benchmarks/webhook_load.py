@@ -0,0 +1,94 @@
+"""Нагрузочный замер приёмника вебхука: фейковый Telegram шлёт синтетические обновления
+
+Обработчик-заглушка имитирует поход в API (asyncio.sleep). Запуск:
+
+    python benchmarks/webhook_load.py --updates 5000 --connections 40 --handler-ms 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bot'))
+
+from webhook import WebhookReceiver  # noqa: E402
+
+SECRET = 'bench-secret'
+
+
+def synthetic_update(update_id):
+    if update_id % 5 == 0:
+        return {'update_id': update_id, 'callback_query': {'id': str(update_id), 'data': 'add_event'}}
+    if update_id % 17 == 0:
+        # Неподдерживаемый тип - должен отбрасываться без обработки
+        return {'update_id': update_id, 'edited_message': {'message_id': update_id, 'text': 'x'}}
+    return {'update_id': update_id, 'message': {'message_id': update_id, 'text': 'РАБОТА'}}
+
+
+async def fake_telegram(port, path, update_ids):
+    """Одно keep-alive соединение, как у Telegram, с последовательной доставкой"""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    statuses = {}
+    for update_id in update_ids:
+        body = json.dumps(synthetic_update(update_id)).encode('utf-8')
+        writer.write(
+            f'POST {path} HTTP/1.1\r\nHost: bench\r\nContent-Type: application/json\r\n'
+            f'X-Telegram-Bot-Api-Secret-Token: {SECRET}\r\nContent-Length: {len(body)}\r\n\r\n'.encode('latin-1') + body
+        )
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await reader.readline()
+            if line == b'\r\n':
+                break
+            if line.lower().startswith(b'content-length:'):
+                length = int(line.split(b':')[1])
+        await reader.readexactly(length)
+        statuses[status] = statuses.get(status, 0) + 1
+    writer.close()
+    return statuses
+
+
+async def main(args):
+    async def handler(update):
+        await asyncio.sleep(args.handler_ms / 1000)
+
+    receiver = WebhookReceiver(handler, host='127.0.0.1', port=0, path='/webhook', secret_token=SECRET,
+                               allowed_updates=['message', 'callback_query'],
+                               workers=args.workers, queue_size=args.queue_size)
+    await receiver.start()
+
+    ids = list(range(1, args.updates + 1))
+    chunks = [ids[i::args.connections] for i in range(args.connections)]
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(fake_telegram(receiver.port, '/webhook', chunk) for chunk in chunks))
+    accepted_in = time.perf_counter() - started
+    await receiver.queue.join()
+    processed_in = time.perf_counter() - started
+    await receiver.stop()
+
+    statuses = {}
+    for result in results:
+        for status, count in result.items():
+            statuses[status] = statuses.get(status, 0) + count
+
+    metrics = receiver.metrics()
+    print(f'Отправлено {args.updates} обновлений за {accepted_in:.2f} с ({args.updates / accepted_in:.0f}/с), '
+          f'ответы: {statuses}')
+    print(f'Обработано {metrics["latency"]["count"]} за {processed_in:.2f} с, '
+          f'отброшено неподдерживаемых: {metrics["ignored"]}, отклонено (503): {metrics["rejected"]}')
+    print(f'Задержка обработки: {metrics["latency"]}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--updates', type=int, default=5000)
+    parser.add_argument('--connections', type=int, default=40)
+    parser.add_argument('--workers', type=int, default=64)
+    parser.add_argument('--queue-size', type=int, default=10000)
+    parser.add_argument('--handler-ms', type=float, default=20)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,142 @@
+"""Замер сериализации недельного ответа: прежний путь против app/serializers.py
+
+Создаёт SQLite в памяти, кладёт N событий в одну неделю и сравнивает:
+ORM + joinedload + isoformat + json (как было), строки-кортежи + кэш
+меток + json, то же с orjson, и колоночный формат. Запуск:
+
+    python benchmarks/week_serialize.py --events 10000 --repeat 5
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+
+from sqlalchemy.orm import joinedload  # noqa: E402
+
+from app import create_app, db  # noqa: E402
+from app.models import User, Category, Event  # noqa: E402
+from app.serializers import event_rows, events_columnar, week_event_dict  # noqa: E402
+
+WEEK_START = datetime(2025, 3, 3)
+
+
+def seed(events):
+    user = User(username='bench')
+    db.session.add(user)
+    db.session.flush()
+    categories = [Category(user_id=user.id, name=f'Категория {i}', color='#4361ee') for i in range(12)]
+    db.session.add_all(categories)
+    db.session.flush()
+    rows = []
+    for i in range(events):
+        start = WEEK_START + timedelta(minutes=(i * 7) % (7 * 24 * 60 - 60))
+        rows.append({
+            'user_id': user.id,
+            'category_id': categories[i % len(categories)].id,
+            'start_time': start,
+            'end_time': start + timedelta(minutes=30 + i % 4 * 15),
+            'type': 'plan' if i % 3 else 'fact',
+            'source': 'web'
+        })
+    db.session.bulk_insert_mappings(Event, rows)
+    db.session.commit()
+    return user.id
+
+
+def old_path(user_id):
+    events = Event.query.options(joinedload(Event.category)).filter(
+        Event.user_id == user_id,
+        Event.start_time >= WEEK_START,
+        Event.start_time < WEEK_START + timedelta(days=7)
+    ).order_by(Event.start_time).all()
+    events_list = []
+    for event in events:
+        category = event.category
+        events_list.append({
+            'id': event.id,
+            'category_id': event.category_id,
+            'category_name': category.name if category else 'Без категории',
+            'category_color': category.color if category else '#4361ee',
+            'start_time': event.start_time.isoformat() + 'Z',
+            'end_time': event.end_time.isoformat() + 'Z',
+            'type': event.type,
+            'description': '',
+            'duration': int((event.end_time - event.start_time).total_seconds() / 60)
+        })
+    db.session.expunge_all()
+    return json.dumps({'success': True, 'events': events_list}, ensure_ascii=True, sort_keys=True)
+
+
+def week_rows(user_id):
+    return event_rows(
+        Event.user_id == user_id,
+        Event.start_time >= WEEK_START,
+        Event.start_time < WEEK_START + timedelta(days=7)
+    ).order_by(Event.start_time).all()
+
+
+def rows_stdlib(user_id):
+    events_list = [week_event_dict(row) for row in week_rows(user_id)]
+    return json.dumps({'success': True, 'events': events_list}, ensure_ascii=True, sort_keys=True)
+
+
+def rows_json(user_id, dumps):
+    return dumps({'success': True, 'events': [week_event_dict(row) for row in week_rows(user_id)]})
+
+
+def columnar_json(user_id, dumps):
+    return dumps(events_columnar(week_rows(user_id), WEEK_START))
+
+
+def measure(func, repeat):
+    best = None
+    size = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+        size = len(body.encode('utf-8') if isinstance(body, str) else body)
+    return best, size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--events', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        user_id = seed(args.events)
+
+        cases = [
+            ('ORM + isoformat + json', lambda: old_path(user_id)),
+            ('строки + кэш меток + json', lambda: rows_stdlib(user_id)),
+        ]
+        try:
+            import orjson
+            option = orjson.OPT_SORT_KEYS
+            cases.append(('строки + orjson', lambda: rows_json(user_id, lambda obj: orjson.dumps(obj, option=option))))
+            cases.append(('колонки + orjson', lambda: columnar_json(user_id, orjson.dumps)))
+        except ImportError:
+            print('orjson не установлен - замер только для стандартного json')
+        cases.append(('колонки + json', lambda: columnar_json(user_id, json.dumps)))
+
+        baseline = None
+        for name, func in cases:
+            elapsed, size = measure(func, args.repeat)
+            baseline = baseline or elapsed
+            print(f'{name:>28}: {elapsed * 1000:8.1f} мс, {size / 1024:8.1f} КиБ, x{baseline / elapsed:.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+import asyncio
+import logging
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class ApiClient:
+    """Общий асинхронный клиент к API трекера
+
+    Один httpx.AsyncClient на весь процесс: keep-alive пул соединений,
+    таймауты на каждый вызов и семафор, ограничивающий число
+    одновременных запросов к серверу.
+    """
+
+    def __init__(self, base_url, max_connections=20, concurrency=20, timeout=10.0, connect_timeout=5.0):
+        self.base_url = base_url.rstrip('/')
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.concurrency = concurrency
+        self._client = None
+        self._semaphore = None
+
+    async def start(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(base_url=self.base_url, limits=self.limits, timeout=self.timeout)
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def request(self, method, path, telegram_id=None, timeout=None, **kwargs):
+        """Выполнить запрос; при сетевой ошибке или таймауте вернуть None"""
+        await self.start()
+        headers = kwargs.pop('headers', {})
+        if telegram_id is not None:
+            headers['X-Telegram-ID'] = str(telegram_id)
+        if timeout is not None:
+            kwargs['timeout'] = timeout
+        async with self._semaphore:
+            try:
+                return await self._client.request(method, path, headers=headers, **kwargs)
+            except httpx.HTTPError as e:
+                logger.warning('API %s %s: %s', method, path, e)
+                return None
+
+    async def get(self, path, **kwargs):
+        return await self.request('GET', path, **kwargs)
+
+    async def post(self, path, **kwargs):
+        return await self.request('POST', path, **kwargs)
@@ -1,28 +1,53 @@
 import os
-import requests
+import asyncio
 import logging
+import signal
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters, ContextTypes
+from api_client import ApiClient
+from category_cache import CategoryCache, match_category
+from quick_queue import QuickEventQueue
+from webhook import WebhookReceiver
 
 # Конфигурация
 API_URL = os.environ.get('API_URL', 'https://time-tracker-z6co.onrender.com/api/v1')
 TELEGRAM_TOKEN = os.environ.get('TELEGRAM_TOKEN')
+API_TIMEOUT = float(os.environ.get('API_TIMEOUT', 10))
+API_CONCURRENCY = int(os.environ.get('API_CONCURRENCY', 20))
+BOT_CONCURRENT_UPDATES = int(os.environ.get('BOT_CONCURRENT_UPDATES', 32))
+CATEGORY_CACHE_TTL = int(os.environ.get('CATEGORY_CACHE_TTL', 60))
+BOT_MODE = os.environ.get('BOT_MODE', 'polling')  # polling или webhook
+WEBHOOK_URL = os.environ.get('WEBHOOK_URL')  # Публичный адрес, например https://bot.example.com
+WEBHOOK_PATH = os.environ.get('WEBHOOK_PATH', '/telegram/webhook')
+WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET')
+WEBHOOK_METRICS_TOKEN = os.environ.get('WEBHOOK_METRICS_TOKEN')  # GET /metrics; по умолчанию WEBHOOK_SECRET
+WEBHOOK_PORT = int(os.environ.get('PORT', 8080))
+WEBHOOK_WORKERS = int(os.environ.get('WEBHOOK_WORKERS', 16))
+QUICK_QUEUE_PATH = os.environ.get('QUICK_QUEUE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'quick_queue.sqlite3'))
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Обрабатываем только сообщения и нажатия кнопок - остальное Telegram не присылает
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY]
+
+# Один клиент с пулом соединений на весь процесс
+api = ApiClient(API_URL, max_connections=API_CONCURRENCY, concurrency=API_CONCURRENCY, timeout=API_TIMEOUT)
+category_cache = CategoryCache(api, ttl=CATEGORY_CACHE_TTL)
+quick_queue = QuickEventQueue(QUICK_QUEUE_PATH, api)
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик команды /start"""
     user = update.effective_user
     
     # Проверяем/регистрируем пользователя в системе
-    response = requests.post(f'{API_URL}/telegram/auth', json={
+    response = await api.post('/telegram/auth', json={
         'telegram_id': str(user.id),
         'username': user.username or user.first_name
     })
     
-    if response.status_code == 200:
+    if response is not None and response.status_code in (200, 404):
         data = response.json()
         
         if data['status'] == 'authenticated':
@@ -54,16 +79,11 @@ async def add_event(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     
-    # Получаем категории пользователя
+    # Получаем категории пользователя (обычно из кэша, без сети)
     user_id = query.from_user.id
-    response = requests.get(
-        f'{API_URL}/telegram/categories',
-        headers={'X-Telegram-ID': str(user_id)}
-    )
+    categories = await category_cache.get(user_id)
     
-    if response.status_code == 200:
-        categories = response.json()['quick_replies']
-        
+    if categories:
         keyboard = []
         row = []
         for i, cat in enumerate(categories):
@@ -88,29 +108,28 @@ async def quick_event(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message_text = update.message.text.strip().upper()
     user_id = update.effective_user.id
     
-    # Пытаемся создать событие по коду
-    response = requests.post(
-        f'{API_URL}/telegram/quick',
-        headers={'X-Telegram-ID': str(user_id)},
-        json={'code': message_text, 'duration': 60}
-    )
+    # Проверяем код по кэшу категорий; если API недоступен - просто ставим в очередь
+    category_name = message_text
+    categories = await category_cache.categories(user_id)
+    if categories is not None:
+        category = match_category(categories, message_text)
+        if not category:
+            await update.message.reply_text('Категория не найдена. Используйте /start для выбора.')
+            return
+        category_name = category['name']
     
-    if response.status_code == 201:
-        data = response.json()
-        await update.message.reply_text(f'✅ Добавлено: {data["category"]} (60 мин)')
-    else:
-        await update.message.reply_text('Категория не найдена. Используйте /start для выбора.')
+    # Событие сохраняется локально и уходит на сервер пачкой в фоне
+    quick_queue.enqueue(user_id, update.effective_chat.id, message_text, 60,
+                        sent_at=update.message.date.timestamp())
+    await update.message.reply_text(f'✅ Добавлено: {category_name} (60 мин)')
 
 async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Получение статистики"""
     user_id = update.effective_user.id
     
-    response = requests.get(
-        f'{API_URL}/telegram/stats',
-        headers={'X-Telegram-ID': str(user_id)}
-    )
+    response = await api.get('/telegram/stats', telegram_id=user_id)
     
-    if response.status_code == 200:
+    if response is not None and response.status_code == 200:
         stats = response.json()
         message = (
             f'📊 Ваша статистика:\n'
@@ -122,9 +141,73 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         await update.message.reply_text('Не удалось получить статистику.')
 
+async def post_init(application):
+    await api.start()
+    
+    async def report_quick_error(chat_id, code, message):
+        await application.bot.send_message(chat_id, f'⚠️ Не удалось сохранить «{code}»: {message}')
+    
+    quick_queue.on_error = report_quick_error
+    application.bot_data['quick_queue_task'] = asyncio.create_task(quick_queue.run())
+
+async def post_shutdown(application):
+    task = application.bot_data.pop('quick_queue_task', None)
+    if task:
+        task.cancel()
+    await quick_queue.flush()  # Последняя попытка; неотправленное останется на диске
+    quick_queue.close()
+    await api.close()
+
+async def run_webhook(application):
+    """Режим вебхука: свой приёмник обновлений и пул воркеров вместо long polling"""
+    receiver = WebhookReceiver(
+        application.process_update,
+        decode=lambda data: Update.de_json(data, application.bot),
+        port=WEBHOOK_PORT,
+        path=WEBHOOK_PATH,
+        secret_token=WEBHOOK_SECRET,
+        metrics_token=WEBHOOK_METRICS_TOKEN,
+        allowed_updates=ALLOWED_UPDATES,
+        workers=WEBHOOK_WORKERS
+    )
+    
+    await application.initialize()
+    await post_init(application)
+    await application.start()
+    await receiver.start()
+    await application.bot.set_webhook(
+        WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH,
+        allowed_updates=ALLOWED_UPDATES,
+        secret_token=WEBHOOK_SECRET,
+        max_connections=WEBHOOK_WORKERS
+    )
+    
+    # SIGTERM при редеплое и Ctrl+C: дождаться очереди вебхука и отправить очередь событий
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stopping.set)
+    
+    try:
+        await stopping.wait()
+        logger.info('Получен сигнал остановки')
+    finally:
+        logger.info('Метрики вебхука: %s', receiver.metrics())
+        await receiver.stop()
+        await application.stop()
+        await post_shutdown(application)
+        await application.shutdown()
+
 def main():
     """Запуск бота"""
-    application = Application.builder().token(TELEGRAM_TOKEN).build()
+    application = (
+        Application.builder()
+        .token(TELEGRAM_TOKEN)
+        .concurrent_updates(BOT_CONCURRENT_UPDATES)  # Обработчики не ждут друг друга
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
     
     # Регистрация обработчиков
     application.add_handler(CommandHandler("start", start))
@@ -134,7 +217,12 @@ def main():
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, quick_event))
     
     # Запуск бота
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    if BOT_MODE == 'webhook':
+        if not WEBHOOK_URL:
+            raise ValueError('Для BOT_MODE=webhook задайте WEBHOOK_URL')
+        asyncio.run(run_webhook(application))
+    else:
+        application.run_polling(allowed_updates=ALLOWED_UPDATES)
 
 if __name__ == '__main__':
     main()
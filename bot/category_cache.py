@@ -0,0 +1,111 @@
+import time
+from collections import OrderedDict
+
+
+class CategoryCache:
+    """Категории пользователей в памяти бота
+
+    Пока запись свежая (ttl), клавиатура строится без сети. Потом бот
+    спрашивает /telegram/sync?since=<cursor>&types=categories и получает
+    только изменённые и удалённые категории - в обычном случае пустой ответ.
+    При недоступности API отдаём последнюю известную версию.
+    """
+
+    def __init__(self, api, ttl=60, maxsize=1000):
+        self.api = api
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+
+    async def get(self, telegram_id):
+        """Список quick_replies пользователя или None, если получить не удалось"""
+        entry = await self._load(telegram_id)
+        return entry['quick_replies'] if entry else None
+
+    async def categories(self, telegram_id):
+        """Полный список категорий пользователя или None"""
+        entry = await self._load(telegram_id)
+        return entry['categories'] if entry else None
+
+    async def _load(self, telegram_id):
+        key = str(telegram_id)
+        entry = self._entries.get(key)
+        if entry is not None and entry['expires_at'] > time.monotonic():
+            self._entries.move_to_end(key)
+            return entry
+
+        params = {'types': 'categories'}
+        if entry is not None:
+            params['since'] = entry['cursor']
+        response = await self.api.get('/telegram/sync', telegram_id=telegram_id, params=params)
+
+        if response is None:
+            return entry
+        if response.status_code != 200:
+            self._entries.pop(key, None)
+            return None
+
+        data = response.json()
+        if data['reset'] or entry is None:
+            categories = data['categories']
+        else:
+            categories = merge_changes(entry['categories'], data['categories'], data['deleted']['categories'])
+        entry = {
+            'categories': categories,
+            'quick_replies': [
+                {'text': category['name'], 'callback_data': f'cat_{category["id"]}'}
+                for category in categories[:10]  # Ограничение для Telegram
+            ],
+            'cursor': data['cursor'],
+            'expires_at': time.monotonic() + self.ttl
+        }
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, telegram_id):
+        self._entries.pop(str(telegram_id), None)
+
+
+def merge_changes(items, changed, deleted_ids):
+    """Применить ответ /sync к списку словарей с id (порядок - по id)"""
+    by_id = {item['id']: item for item in items}
+    for item in changed:
+        by_id[item['id']] = item
+    for item_id in deleted_ids:
+        by_id.pop(item_id, None)
+    return [by_id[item_id] for item_id in sorted(by_id)]
+
+
+def _normalize(code):
+    return ' '.join(str(code).split()).lower().replace('ё', 'е')
+
+
+def match_category(categories, code):
+    """Категория по коду в том же порядке, что и на сервере
+
+    Точное совпадение, затем префикс, затем подстрока; при равенстве
+    короткий код важнее названия, затем меньший id.
+    """
+    code = _normalize(code)
+    if not code:
+        return None
+    best_key, best = None, None
+    for category in categories:
+        terms = [(_normalize(alias), 0) for alias in category.get('aliases', [])]
+        terms.append((_normalize(category['name']), 1))
+        for term, kind in terms:
+            if term == code:
+                key = (0, 0, 0, kind)
+            elif term.startswith(code):
+                key = (1, 0, len(term), kind)
+            elif code in term:
+                key = (2, term.find(code), len(term), kind)
+            else:
+                continue
+            key += (category['id'],)
+            if best_key is None or key < best_key:
+                best_key, best = key, category
+    return best
@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import sqlite3
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+class QuickEventQueue:
+    """Надёжная локальная очередь быстрых событий (SQLite)
+
+    Сообщение пользователя сразу записывается на диск, а фоновая задача
+    отправляет накопившиеся события пачками в /telegram/quick/batch.
+    У каждого события свой ключ идемпотентности, поэтому повтор пачки
+    после таймаута или рестарта сервера не создаёт дубликатов.
+    """
+
+    def __init__(self, path, api, batch_size=50, interval=5.0, linger=0.5,
+                 max_attempts=8, backoff=5.0, max_backoff=900.0):
+        self.api = api
+        self.batch_size = batch_size
+        self.interval = interval
+        self.linger = linger
+        # Повторы при 5xx/409: пауза backoff * 2^(попытка-1), не больше max_backoff;
+        # после max_attempts событие уходит в quick_events_dead
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.on_error = None  # async callback(chat_id, code, message)
+        self._wakeup = asyncio.Event()
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS quick_events ('
+            'key TEXT PRIMARY KEY, telegram_id TEXT NOT NULL, chat_id INTEGER NOT NULL, '
+            'code TEXT NOT NULL, duration INTEGER NOT NULL, sent_at REAL NOT NULL, '
+            'attempts INTEGER NOT NULL DEFAULT 0, next_attempt_at REAL NOT NULL DEFAULT 0)'
+        )
+        columns = {row[1] for row in self._db.execute('PRAGMA table_info(quick_events)')}
+        if 'next_attempt_at' not in columns:
+            # Очередь, созданная прежней версией бота
+            self._db.execute('ALTER TABLE quick_events ADD COLUMN next_attempt_at REAL NOT NULL DEFAULT 0')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS quick_events_dead ('
+            'key TEXT PRIMARY KEY, telegram_id TEXT NOT NULL, chat_id INTEGER NOT NULL, '
+            'code TEXT NOT NULL, duration INTEGER NOT NULL, sent_at REAL NOT NULL, '
+            'attempts INTEGER NOT NULL, failed_at REAL NOT NULL, error TEXT)'
+        )
+
+    def enqueue(self, telegram_id, chat_id, code, duration, sent_at=None):
+        """Записать событие в очередь и вернуть его ключ"""
+        key = uuid.uuid4().hex
+        self._db.execute(
+            'INSERT INTO quick_events (key, telegram_id, chat_id, code, duration, sent_at) VALUES (?, ?, ?, ?, ?, ?)',
+            (key, str(telegram_id), chat_id, code, duration, sent_at or time.time())
+        )
+        self._wakeup.set()
+        return key
+
+    def pending(self):
+        return self._db.execute('SELECT COUNT(*) FROM quick_events').fetchone()[0]
+
+    def _delete(self, keys):
+        self._db.executemany('DELETE FROM quick_events WHERE key = ?', [(key,) for key in keys])
+
+    def dead(self):
+        return self._db.execute('SELECT COUNT(*) FROM quick_events_dead').fetchone()[0]
+
+    def _chunks(self, entries):
+        """Новые события - пачками; уже падавшие - по одному, чтобы «ядовитое» не держало остальные"""
+        chunk = []
+        for entry in entries:
+            if entry[6] > 0:
+                if chunk:
+                    yield chunk
+                    chunk = []
+                yield [entry]
+                continue
+            chunk.append(entry)
+            if len(chunk) == self.batch_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    async def _retry_later(self, chunk, error):
+        """Отложить пачку с экспоненциальной паузой; исчерпавшие попытки - в quick_events_dead"""
+        now = time.time()
+        for key, telegram_id, chat_id, code, duration, sent_at, attempts in chunk:
+            attempts += 1
+            if attempts >= self.max_attempts:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO quick_events_dead '
+                    '(key, telegram_id, chat_id, code, duration, sent_at, attempts, failed_at, error) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (key, telegram_id, chat_id, code, duration, sent_at, attempts, now, error)
+                )
+                self._delete([key])
+                logger.warning('Быстрое событие %s отложено в quick_events_dead после %d попыток: %s',
+                               key, attempts, error)
+                await self._notify_error(chat_id, code, f'сервер не принял событие после {attempts} попыток')
+            else:
+                delay = min(self.backoff * 2 ** (attempts - 1), self.max_backoff)
+                self._db.execute(
+                    'UPDATE quick_events SET attempts = ?, next_attempt_at = ? WHERE key = ?',
+                    (attempts, now + delay, key)
+                )
+
+    async def flush(self):
+        """Отправить очередь пачками по пользователям; вернуть число подтверждённых событий
+
+        Ошибка пачки одного пользователя не останавливает отправку остальных.
+        """
+        rows = self._db.execute(
+            'SELECT key, telegram_id, chat_id, code, duration, sent_at, attempts FROM quick_events '
+            'WHERE next_attempt_at <= ? ORDER BY sent_at LIMIT ?', (time.time(), self.batch_size * 20)
+        ).fetchall()
+
+        batches = {}
+        for row in rows:
+            batches.setdefault(row[1], []).append(row)
+
+        delivered = 0
+        for telegram_id, entries in batches.items():
+            for chunk in self._chunks(entries):
+                keys = [entry[0] for entry in chunk]
+                response = await self.api.post('/telegram/quick/batch', telegram_id=telegram_id, json={
+                    'events': [{'key': key, 'code': code, 'duration': duration, 'sent_at': sent_at}
+                               for key, _, _, code, duration, sent_at, _ in chunk]
+                })
+
+                if response is None:
+                    # Сервер недоступен для всех - попытки не считаем, повтор по таймеру run()
+                    return delivered
+
+                if response.status_code >= 500 or response.status_code == 409:
+                    # Сбой этой пачки: откладываем её и переходим к следующему пользователю
+                    await self._retry_later(chunk, f'HTTP {response.status_code}')
+                    break
+
+                try:
+                    data = response.json() if response.content else {}
+                    if not isinstance(data, dict):
+                        raise ValueError('not an object')
+                except ValueError:
+                    # Не JSON (например, HTML-страница прокси) - как сбой сервера
+                    await self._retry_later(chunk, f'HTTP {response.status_code}: invalid body')
+                    break
+
+                if response.status_code != 200:
+                    # Ошибка клиента (например, пользователь не зарегистрирован) - повтор не поможет
+                    message = data.get('error', 'Ошибка сервера')
+                    self._delete(keys)
+                    for _, _, chat_id, code, _, _, _ in chunk:
+                        await self._notify_error(chat_id, code, message)
+                    continue
+
+                results = {result['key']: result for result in data.get('results', [])}
+                self._delete(keys)
+                delivered += len(keys)
+                for key, _, chat_id, code, _, _, _ in chunk:
+                    result = results.get(key)
+                    if result and result['status'] == 'error':
+                        await self._notify_error(chat_id, code, result.get('error', ''))
+        return delivered
+
+    async def _notify_error(self, chat_id, code, message):
+        if self.on_error is not None:
+            try:
+                await self.on_error(chat_id, code, message)
+            except Exception:
+                logger.exception('Не удалось сообщить об ошибке быстрого события')
+
+    async def run(self):
+        """Фоновая отправка: сразу после новых событий (с небольшой задержкой для пачки) или по таймеру"""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+                await asyncio.sleep(self.linger)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception('Ошибка отправки очереди быстрых событий')
+
+    def close(self):
+        self._db.close()
@@ -0,0 +1,208 @@
+import asyncio
+import hmac
+import json
+import logging
+import time
+from bisect import insort
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_SIZE = 1024 * 1024
+REASONS = {200: 'OK', 400: 'Bad Request', 403: 'Forbidden', 404: 'Not Found',
+           405: 'Method Not Allowed', 413: 'Payload Too Large', 503: 'Service Unavailable'}
+
+
+def _token_matches(value, token):
+    """Сравнение за постоянное время; заголовки декодированы как latin-1 и могут быть не ASCII"""
+    return hmac.compare_digest(value.encode('latin-1'), token.encode('utf-8'))
+
+
+class LatencyStats:
+    """Задержка обработки обновлений: от приёма вебхука до конца обработчика"""
+
+    def __init__(self, window=1000):
+        self.window = window
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._recent = []
+        self._sorted = []
+
+    def observe(self, seconds, failed=False):
+        self.count += 1
+        self.errors += int(failed)
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self._recent.append(seconds)
+        insort(self._sorted, seconds)
+        if len(self._recent) > self.window:
+            self._sorted.remove(self._recent.pop(0))
+
+    def percentile(self, p):
+        if not self._sorted:
+            return 0.0
+        return self._sorted[min(len(self._sorted) - 1, int(len(self._sorted) * p))]
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'avg_ms': round(self.total / self.count * 1000, 2) if self.count else 0,
+            'p50_ms': round(self.percentile(0.5) * 1000, 2),
+            'p95_ms': round(self.percentile(0.95) * 1000, 2),
+            'p99_ms': round(self.percentile(0.99) * 1000, 2),
+            'max_ms': round(self.max * 1000, 2)
+        }
+
+
+class WebhookReceiver:
+    """Небольшой HTTP-приёмник вебхука Telegram с пулом воркеров
+
+    Принимает POST на path, сверяет X-Telegram-Bot-Api-Secret-Token,
+    отбрасывает неподдерживаемые типы обновлений и сразу отвечает 200,
+    а обработку передаёт ограниченному пулу воркеров через очередь.
+    Если очередь заполнена, отвечает 503 - Telegram повторит доставку.
+    GET /metrics отдаёт статистику задержек только с заголовком
+    Authorization: Bearer <metrics_token> (по умолчанию - secret_token);
+    без токена метрики выключены.
+    """
+
+    def __init__(self, process_update, decode=None, host='0.0.0.0', port=8080, path='/webhook',
+                 secret_token=None, allowed_updates=None, workers=8, queue_size=1000, metrics_token=None):
+        self.process_update = process_update
+        self.decode = decode or (lambda data: data)
+        self.host = host
+        self.port = port
+        self.path = path
+        self.secret_token = secret_token
+        self.metrics_token = metrics_token or secret_token
+        self.allowed_updates = set(allowed_updates or [])
+        self.workers = workers
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.latency = LatencyStats()
+        self.rejected = 0
+        self.ignored = 0
+        self._server = None
+        self._tasks = []
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info('Webhook слушает %s:%s%s, воркеров: %s', self.host, self.port, self.path, self.workers)
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        await self.queue.join()
+        for task in self._tasks:
+            task.cancel()
+
+    def metrics(self):
+        return {
+            'latency': self.latency.snapshot(),
+            'queued': self.queue.qsize(),
+            'rejected': self.rejected,
+            'ignored': self.ignored
+        }
+
+    async def _worker(self):
+        while True:
+            update, received_at = await self.queue.get()
+            failed = False
+            try:
+                await self.process_update(update)
+            except Exception:
+                failed = True
+                logger.exception('Ошибка обработки обновления')
+            finally:
+                self.latency.observe(time.perf_counter() - received_at, failed)
+                self.queue.task_done()
+
+    def _accept(self, method, target, headers, body):
+        """Проверить запрос и поставить обновление в очередь; вернуть (статус, тело)"""
+        if target == '/metrics' and method == 'GET':
+            # Порт вебхука публичный - метрики только по токену
+            if not self.metrics_token:
+                return 404, {'error': 'not found'}
+            if not _token_matches(headers.get('authorization', ''), f'Bearer {self.metrics_token}'):
+                return 403, {'error': 'forbidden'}
+            return 200, self.metrics()
+        if target != self.path:
+            return 404, {'error': 'not found'}
+        if method != 'POST':
+            return 405, {'error': 'method not allowed'}
+        if self.secret_token and not _token_matches(
+                headers.get('x-telegram-bot-api-secret-token', ''), self.secret_token):
+            return 403, {'error': 'forbidden'}
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return 400, {'error': 'invalid json'}
+        if not isinstance(data, dict) or 'update_id' not in data:
+            return 400, {'error': 'not an update'}
+        if self.allowed_updates and not self.allowed_updates.intersection(data):
+            self.ignored += 1
+            return 200, {}
+        try:
+            update = self.decode(data)
+        except Exception:
+            logger.warning('Не удалось разобрать обновление %s', data.get('update_id'), exc_info=True)
+            return 400, {'error': 'invalid update'}
+        try:
+            self.queue.put_nowait((update, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return 503, {'error': 'busy'}
+        return 200, {}
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, _ = request_line.decode('latin-1').split(' ', 2)
+                except ValueError:
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                try:
+                    length = int(headers.get('content-length') or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    # Границу тела не знаем - отвечаем и закрываем соединение
+                    status, payload = 400, {'error': 'invalid content-length'}
+                    keep_alive = False
+                elif length > MAX_BODY_SIZE:
+                    status, payload = 413, {'error': 'too large'}
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b''
+                    status, payload = self._accept(method, target, headers, body)
+                    keep_alive = headers.get('connection', '').lower() != 'close'
+
+                data = json.dumps(payload).encode('utf-8')
+                writer.write(
+                    f'HTTP/1.1 {status} {REASONS.get(status, "")}\r\n'
+                    f'Content-Type: application/json\r\nContent-Length: {len(data)}\r\n'
+                    f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'.encode('latin-1') + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
@@ -1,5 +1,11 @@
 import os
 
+
+def _env_int(name):
+    value = os.environ.get(name)
+    return int(value) if value else None
+
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or ''
     
@@ -9,17 +15,72 @@ class Config:
     if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
         DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
     
-    # ИСПРАВЛЕНО: Правильный fallback или логирование ошибки
-    if DATABASE_URL:
-        SQLALCHEMY_DATABASE_URI = DATABASE_URL
-        print(f" * Используется PostgreSQL: {DATABASE_URL[:50]}...")  # Логируем первые 50 символов
-    else:
-        # Лучше упасть с понятной ошибкой, чем молча использовать SQLite
-        raise ValueError(
-            "Переменная окружения DATABASE_URL не установлена!\n"
-            "Установите её в Render: Settings → Environment Variables\n"
-            "Или проверьте строку подключения в PostgreSQL → Connections"
-        )
+    # Без DATABASE_URL ошибку даёт create_app(), а не импорт конфигурации;
+    # молча подставлять SQLite нельзя
+    SQLALCHEMY_DATABASE_URI = DATABASE_URL
     
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    
+    # Пул соединений и таймаут запросов PostgreSQL (см. app/pool.py).
+    # Профиль выбирается DB_PROFILE; отдельные значения переопределяются DB_POOL_SIZE и т.п.
+    DB_PROFILES = {
+        # Локальная разработка: маленький пул, долгие запросы допустимы
+        'development': {'pool_size': 2, 'max_overflow': 3, 'pool_timeout': 30, 'pool_recycle': 1800,
+                        'pool_pre_ping': True, 'statement_timeout_ms': 60000},
+        # Воркеры gunicorn (gthread): пул под потоки, Render закрывает простаивающие соединения
+        'production': {'pool_size': 10, 'max_overflow': 10, 'pool_timeout': 5, 'pool_recycle': 280,
+                       'pool_pre_ping': True, 'statement_timeout_ms': 5000},
+        # CLI-команды (init-db, backfill-rollups): одно соединение, без таймаута запросов
+        'maintenance': {'pool_size': 1, 'max_overflow': 0, 'pool_timeout': 30, 'pool_recycle': 1800,
+                        'pool_pre_ping': True, 'statement_timeout_ms': 0},
+    }
+    DB_PROFILE = os.environ.get('DB_PROFILE') or ('production' if os.environ.get('RENDER') else 'development')
+    DB_POOL_SIZE = _env_int('DB_POOL_SIZE')
+    DB_MAX_OVERFLOW = _env_int('DB_MAX_OVERFLOW')
+    DB_POOL_TIMEOUT = _env_int('DB_POOL_TIMEOUT')
+    DB_POOL_RECYCLE = _env_int('DB_POOL_RECYCLE')
+    DB_STATEMENT_TIMEOUT_MS = _env_int('DB_STATEMENT_TIMEOUT_MS')
+    
+    # Реплика для чтения (app/replica.py): GET-запросы читают с неё, кроме
+    # REPLICA_STICKY_SECONDS после записи пользователя; REPLICA_STICKY_URL (redis://...)
+    # делает эти отметки общими для воркеров
+    REPLICA_DATABASE_URL = os.environ.get('REPLICA_DATABASE_URL')
+    if REPLICA_DATABASE_URL and REPLICA_DATABASE_URL.startswith("postgres://"):
+        REPLICA_DATABASE_URL = REPLICA_DATABASE_URL.replace("postgres://", "postgresql://", 1)
+    REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 10))
+    REPLICA_STICKY_URL = os.environ.get('REPLICA_STICKY_URL')
+    
     SQLALCHEMY_ECHO = False  # Временно ВКЛЮЧИТЕ для отладки!
+    
+    # Кэш недельных ответов; WEEK_CACHE_URL (redis://...) делает его общим для воркеров
+    WEEK_CACHE_URL = os.environ.get('WEEK_CACHE_URL')
+    WEEK_CACHE_TTL = int(os.environ.get('WEEK_CACHE_TTL', 300))
+    WEEK_CACHE_MAXSIZE = int(os.environ.get('WEEK_CACHE_MAXSIZE', 1024))
+    
+    # Бэкенд jsonify: auto (orjson, если установлен), orjson или stdlib
+    JSON_BACKEND = os.environ.get('JSON_BACKEND', 'auto')
+    
+    # Живые обновления (SSE): LIVE_BROKER_URL (redis://...) раздаёт изменения всем воркерам
+    LIVE_BROKER_URL = os.environ.get('LIVE_BROKER_URL')
+    # Поток SSE занимает поток gunicorn (gthread) на LIVE_STREAM_LIFETIME секунд.
+    # WEB_THREADS - это --threads из Dockerfile; LIVE_STREAM_MAX урезается до
+    # WEB_THREADS - LIVE_STREAM_RESERVED_THREADS, чтобы обычным запросам оставались потоки.
+    # Сверх лимита /api/v1/stream отвечает 503, страницы переходят на опрос
+    WEB_THREADS = int(os.environ.get('WEB_THREADS', 32))
+    LIVE_STREAM_RESERVED_THREADS = int(os.environ.get('LIVE_STREAM_RESERVED_THREADS', 8))
+    LIVE_STREAM_MAX = int(os.environ.get('LIVE_STREAM_MAX', 24))
+    LIVE_STREAM_LIFETIME = int(os.environ.get('LIVE_STREAM_LIFETIME', 300))
+    
+    # Сколько дней хранятся записи об удалениях (/api/v1/sync, flask purge-tombstones);
+    # курсор старше - полная выгрузка
+    SYNC_TOMBSTONE_RETENTION_DAYS = int(os.environ.get('SYNC_TOMBSTONE_RETENTION_DAYS', 30))
+    
+    # Логи пакета app: LOG_LEVEL (DEBUG, INFO, WARNING...), LOG_FORMAT=json для разбора агрегатором
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')
+    
+    # Метрики запросов (app/metrics.py): /metrics для Prometheus, доступ по METRICS_TOKEN
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', 1000))
+    # Доля запросов под cProfile (0.01 = 1%); 0 - профилирование выключено
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
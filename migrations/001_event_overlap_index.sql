@@ -0,0 +1,14 @@
+-- Индексы для проверки перекрытий событий при создании и обновлении.
+-- Составной B-tree индекс (его же создаёт db.create_all() на новой базе):
+CREATE INDEX IF NOT EXISTS idx_event_user_type_time
+    ON events (user_id, type, start_time, end_time);
+
+-- GiST-индекс по интервалу для оператора && в find_overlap():
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+CREATE INDEX IF NOT EXISTS idx_event_user_type_range
+    ON events USING gist (user_id, type, tsrange(start_time, end_time));
+
+-- Строгий вариант: запретить перекрытия на уровне БД.
+-- Включать только после очистки уже существующих пересечений:
+-- ALTER TABLE events ADD CONSTRAINT events_no_overlap
+--     EXCLUDE USING gist (user_id WITH =, type WITH =, tsrange(start_time, end_time) WITH &&);
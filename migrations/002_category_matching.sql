@@ -0,0 +1,14 @@
+-- Быстрый поиск категории по коду из бота (app/category_match.py).
+-- Точный поиск по названию без учёта регистра:
+CREATE INDEX IF NOT EXISTS idx_category_user_lower_name
+    ON categories (user_id, lower(name));
+
+-- Короткие коды категорий (их же создаёт db.create_all() на новой базе):
+CREATE TABLE IF NOT EXISTS category_aliases (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users (id),
+    category_id INTEGER NOT NULL REFERENCES categories (id) ON DELETE CASCADE,
+    alias VARCHAR(32) NOT NULL,
+    created_at TIMESTAMP WITHOUT TIME ZONE,
+    CONSTRAINT unique_alias_per_user UNIQUE (user_id, alias)
+);
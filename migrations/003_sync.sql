@@ -0,0 +1,26 @@
+-- Дельта-синхронизация (/api/v1/sync, app/sync.py).
+-- Время последнего изменения строки; для существующих строк - время создания:
+ALTER TABLE events ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITHOUT TIME ZONE;
+UPDATE events SET updated_at = COALESCE(created_at, now() AT TIME ZONE 'utc') WHERE updated_at IS NULL;
+ALTER TABLE events ALTER COLUMN updated_at SET NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_event_user_updated ON events (user_id, updated_at);
+
+ALTER TABLE categories ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITHOUT TIME ZONE;
+UPDATE categories SET updated_at = COALESCE(created_at, now() AT TIME ZONE 'utc') WHERE updated_at IS NULL;
+ALTER TABLE categories ALTER COLUMN updated_at SET NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_category_user_updated ON categories (user_id, updated_at);
+
+ALTER TABLE templates ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITHOUT TIME ZONE;
+UPDATE templates SET updated_at = COALESCE(created_at, now() AT TIME ZONE 'utc') WHERE updated_at IS NULL;
+ALTER TABLE templates ALTER COLUMN updated_at SET NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_template_user_updated ON templates (user_id, updated_at);
+
+-- Записи об удалениях (хранятся 30 дней, очистка: flask purge-tombstones):
+CREATE TABLE IF NOT EXISTS sync_tombstones (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users (id),
+    entity VARCHAR(16) NOT NULL,
+    entity_id INTEGER NOT NULL,
+    deleted_at TIMESTAMP WITHOUT TIME ZONE NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tombstone_user_deleted ON sync_tombstones (user_id, deleted_at);